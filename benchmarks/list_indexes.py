@@ -0,0 +1,116 @@
+"""
+Page latency of the friend / invitation lists of a profile with --rows rows each, with and without the
+(fk, -updated_at, id) list indexes (friendships migrations 0003_list_indexes, 0004_friendship_pairs).
+Runs inside a transaction that is rolled back, against the database of DJANGO_SETTINGS_MODULE (postgres).
+
+Usage (from the repository root, with the service environment loaded, e.g. inside the web container):
+    python benchmarks/list_indexes.py --rows 100000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+CORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'core')
+
+
+def seed(rows: int):
+    from friendships.models import Friendship, FriendshipInvitation, FriendshipPair
+    from profiles.models import Profile
+    from django.db import connection
+
+    user = Profile.objects.create(name='benchmark', external_uuid=uuid.uuid4().hex)
+    others = [Profile(name=f'benchmark {i}', external_uuid=uuid.uuid4().hex) for i in range(rows)]
+    others = Profile.objects.bulk_create(others, batch_size=5000)
+    if others[0].pk is None:
+        others = list(Profile.objects.filter(name__startswith='benchmark ').order_by('id'))
+
+    Friendship.objects.create_pairs([(user.pk, other.pk) for other in others], update_counters=False)
+    FriendshipInvitation.objects.bulk_create(
+        [FriendshipInvitation(inviting=other, invited=user) for other in others], batch_size=5000)
+    FriendshipInvitation.objects.bulk_create(
+        [FriendshipInvitation(inviting=user, invited=other) for other in others], batch_size=5000)
+
+    # bulk_create stamps every row with (almost) the same updated_at, spread them over a year
+    with connection.cursor() as cursor:
+        for model, fk in ((FriendshipPair, 'low_id'), (FriendshipPair, 'high_id'),
+                          (FriendshipInvitation, 'invited_id'), (FriendshipInvitation, 'inviting_id')):
+            table = model._meta.db_table
+            cursor.execute(
+                f"UPDATE {table} SET updated_at = now() - random() * interval '365 days' WHERE {fk} = %s",
+                [user.pk])
+        cursor.execute('ANALYZE')
+    return user
+
+
+def timed(queryset, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        list(queryset)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def measure(lists: dict, page_size: int, repeats: int) -> dict:
+    from django.db.models import Q
+
+    results = {}
+    for name, queryset in lists.items():
+        queryset = queryset.order_by('-updated_at', 'id')
+        # keyset page from the middle of the list, as KeysetPagination seeks it
+        updated_at, id_ = queryset.values_list('updated_at', 'id')[queryset.count() // 2]
+        deep = queryset.filter(Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__gt=id_))
+
+        results[name] = {
+            'first page (ms)': timed(queryset[:page_size + 1], repeats),
+            'middle page (ms)': timed(deep[:page_size + 1], repeats),
+            'plan': queryset[:page_size + 1].explain().splitlines()[0].strip(),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='friends, received and sent invitations')
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    sys.path.insert(0, CORE_DIR)
+    import django
+    django.setup()
+    from django.db import connection, transaction
+    from friendships.models import Friendship, FriendshipInvitation, FriendshipPair
+
+    with transaction.atomic():
+        user = seed(args.rows)
+        lists = {
+            'friends': Friendship.objects.filter(source=user),
+            'received invitations': FriendshipInvitation.objects.filter(invited=user),
+            'created invitations': FriendshipInvitation.objects.filter(inviting=user),
+        }
+        results = {'with list indexes': measure(lists, args.page_size, args.repeats)}
+
+        with connection.schema_editor() as editor:
+            for model in (FriendshipPair, FriendshipInvitation):
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        results['without list indexes'] = measure(lists, args.page_size, args.repeats)
+
+        transaction.set_rollback(True)
+
+    for setup, lists_results in results.items():
+        print(f'{setup} ({args.rows} rows per list)')
+        for name, result in lists_results.items():
+            print(f'  {name:<22}{result["first page (ms)"]:>8.2f} ms first page'
+                  f'{result["middle page (ms)"]:>8.2f} ms middle page   {result["plan"]}')
+
+
+if __name__ == '__main__':
+    main()
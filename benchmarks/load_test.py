@@ -0,0 +1,342 @@
+"""
+Load test of every route of core/urls.py: boots the service (gunicorn.conf.py, tuned with the GUNICORN_* env)
+against a database seeded by generate_fake_data, drives concurrent traffic at each endpoint and reports
+throughput and p50 / p95 / p99 latency per endpoint. Save runs with --output to compare worker settings
+or code changes.
+
+Requests are made by the profiles with the most received invitations, with tokens minted the same way
+as t_helpers.profiles.set_up. Write endpoints consume the seeded invitations / friendships / other profiles
+and stop being requested once their profiles run out of them.
+
+Usage (from the repository root, with the service environment loaded, e.g. inside the web container):
+    python benchmarks/load_test.py --seed --profiles 10000 --friendships 50000 --duration 30
+    python benchmarks/load_test.py --sqlite /tmp/load.sqlite3 --seed  # SQLite stand-in for postgres
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from worker_modes import CORE_DIR, wait_until_up
+
+Endpoint = namedtuple('Endpoint', ['url_name', 'method', 'request'])
+
+BATCH = 5
+
+# the "status" of the requests that got no response (counted as errors)
+NO_RESPONSE = 0
+
+# the service started by this script scrapes with this one, export DJANGO_METRICS_TOKEN for --url
+METRICS_TOKEN = os.environ.setdefault('DJANGO_METRICS_TOKEN', uuid.uuid4().hex)
+
+
+class User:
+    """
+    A profile making requests, with the ids its requests are made of
+    """
+
+    def __init__(self, profile, token: str, kept: dict, consumable: dict) -> None:
+        self.uuid = profile.external_uuid
+        self.auth = f'JWT {token}'
+        self.kept = kept
+        self.consumable = {key: deque(values) for key, values in consumable.items()}
+
+    def take(self, key: str, n: int = 1) -> Optional[list]:
+        """
+        n ids nobody else will request again (None once they run out)
+        """
+        taken = []
+        try:
+            for _ in range(n):
+                taken.append(self.consumable[key].popleft())
+        except IndexError:
+            pass
+        return taken or None
+
+
+def setup_django(sqlite: Optional[str]) -> None:
+    if sqlite:
+        # picked up by core.settings.base (and by the gunicorn workers, which inherit the environment)
+        os.environ['POSTGRES_ENGINE'] = 'django.db.backends.sqlite3'
+        os.environ['POSTGRES_DB'] = os.path.abspath(sqlite)
+    sys.path.insert(0, CORE_DIR)
+    import django
+    django.setup()
+
+
+def mint_token(external_uuid: str) -> str:
+    """
+    same as t_helpers.profiles.set_up
+    """
+    from rest_framework_jwt.settings import api_settings as jwt_settings
+    return jwt_settings.JWT_ENCODE_HANDLER({'uuid': external_uuid})
+
+
+def seed(args) -> None:
+    from django.core.management import call_command
+    from profiles.models import Profile
+
+    call_command('migrate', verbosity=0)
+    call_command('generate_fake_data', force=True, profiles=args.profiles, friendships=args.friendships)
+
+    ids = list(Profile.objects.values_list('id', flat=True))
+    call_command('generate_fake_data', force=True, heroes=random.sample(ids, min(args.users, len(ids))),
+                 invited_f=args.invitations, inviting_f=args.invitations, friends=args.invitations)
+
+
+def prepare_users(n: int) -> List[User]:
+    from friendships.models import Friendship, FriendshipInvitation
+    from profiles.models import Profile
+
+    profiles = list(Profile.objects.order_by('-received_invitation_count', '-friend_count', 'id')[:n])
+    if not profiles:
+        raise SystemExit('no profiles, run with --seed')
+
+    strangers = list(Profile.objects.order_by('?').values_list('external_uuid', flat=True)[:n * 200])
+    users = []
+    for profile in profiles:
+        friendships = list(
+            Friendship.objects.filter(source=profile).values_list('id', 'target__external_uuid'))
+        received = list(FriendshipInvitation.objects.filter(invited=profile).values_list('id', flat=True))
+        created = list(FriendshipInvitation.objects.filter(inviting=profile).values_list('id', flat=True))
+        friend_uuids = [friend_uuid for _, friend_uuid in friendships] or [profile.external_uuid]
+        others = list(set(strangers) - set(friend_uuids) - {profile.external_uuid})
+        kept = {
+            'friend_uuids': friend_uuids,
+            'other_uuids': others or [profile.external_uuid],
+            # the first id of each list is only ever read, the rest is consumed by the write endpoints
+            'received': received[:1],
+            'created': created[:1],
+            'friendships': [id_ for id_, _ in friendships[:1]],
+        }
+        consumable = {
+            'received': received[1:],
+            'created': created[1:],
+            'friendships': [id_ for id_, _ in friendships[1:]],
+            'other_uuids': random.sample(others, len(others)),
+        }
+        users.append(User(profile, mint_token(profile.external_uuid), kept, consumable))
+    return users
+
+
+def kept(key: str, path: str) -> Callable[[User], Optional[Tuple[str, Optional[dict]]]]:
+    def request(user: User):
+        return (path.format(random.choice(user.kept[key])), None) if user.kept[key] else None
+    return request
+
+
+def consumed(key: str, path: str, body: Callable[[list], Optional[dict]] = lambda ids: None,
+             n: int = 1) -> Callable[[User], Optional[Tuple[str, Optional[dict]]]]:
+    def request(user: User):
+        ids = user.take(key, n)
+        return (path.format(ids[0]), body(ids)) if ids else None
+    return request
+
+
+ENDPOINTS = (
+    Endpoint(None, 'GET', lambda user: ('/', None)),
+    Endpoint('metrics', 'GET', lambda user: ('/metrics', None, {'Authorization': f'Bearer {METRICS_TOKEN}'})),
+    Endpoint('profiles-list', 'GET', lambda user: ('/profiles', None)),
+    Endpoint('profiles-list', 'POST', lambda user: ('/profiles', {'token': mint_token(uuid.uuid4().hex)})),
+    Endpoint('profiles-me', 'GET', lambda user: ('/profiles/me', None)),
+    Endpoint('profiles-detail', 'GET', kept('friend_uuids', '/profiles/{}')),
+    Endpoint('profiles-detail', 'PUT', lambda user: (f'/profiles/{user.uuid}', {'name': 'load test'})),
+    Endpoint('profiles-detail', 'PATCH', lambda user: (f'/profiles/{user.uuid}', {'name': 'load test'})),
+    Endpoint('profiles-distance', 'GET', kept('other_uuids', '/profiles/{}/distance')),
+    Endpoint('profiles-mutual-friends', 'GET', kept('friend_uuids', '/profiles/{}/mutual_friends')),
+    Endpoint('received_friend_invitations-list', 'GET', lambda user: ('/received_friend_invitations', None)),
+    Endpoint('received_friend_invitations-detail', 'GET',
+             kept('received', '/received_friend_invitations/{}')),
+    Endpoint('received_friend_invitations-detail', 'DELETE',
+             consumed('received', '/received_friend_invitations/{}')),
+    Endpoint('received_friend_invitations-accept', 'POST',
+             consumed('received', '/received_friend_invitations/{}/accept')),
+    Endpoint('received_friend_invitations-batch-accept', 'POST',
+             consumed('received', '/received_friend_invitations/batch_accept',
+                      lambda ids: {'ids': ids}, BATCH)),
+    Endpoint('received_friend_invitations-batch-decline', 'POST',
+             consumed('received', '/received_friend_invitations/batch_decline',
+                      lambda ids: {'ids': ids}, BATCH)),
+    Endpoint('created_friend_invitations-list', 'GET', lambda user: ('/created_friend_invitations', None)),
+    Endpoint('created_friend_invitations-list', 'POST',
+             consumed('other_uuids', '/created_friend_invitations', lambda uuids: {'friend_uuid': uuids[0]})),
+    Endpoint('created_friend_invitations-batch', 'POST',
+             consumed('other_uuids', '/created_friend_invitations/batch',
+                      lambda uuids: {'friend_uuids': uuids}, BATCH)),
+    Endpoint('created_friend_invitations-detail', 'GET', kept('created', '/created_friend_invitations/{}')),
+    Endpoint('created_friend_invitations-detail', 'DELETE',
+             consumed('created', '/created_friend_invitations/{}')),
+    Endpoint('friends-list', 'GET', lambda user: ('/friends', None)),
+    Endpoint('friends-detail', 'GET', kept('friendships', '/friends/{}')),
+    Endpoint('friends-detail', 'DELETE', consumed('friendships', '/friends/{}')),
+    Endpoint('friend_profiles-list', 'GET', lambda user: ('/friend_profiles', None)),
+    Endpoint('friend_profiles-relationships', 'POST',
+             lambda user: ('/friend_profiles/relationships',
+                           {'uuids': user.kept['friend_uuids'][:10] + user.kept['other_uuids'][:10]})),
+)
+
+
+def check_coverage() -> None:
+    """
+    fails when a route (and method) of core/urls.py has no endpoint above (the debug- ones are local tooling)
+    """
+    from django.urls import get_resolver
+
+    def routes(patterns):
+        for pattern in patterns:
+            if hasattr(pattern, 'url_patterns'):
+                yield from routes(pattern.url_patterns)
+            elif not (pattern.name or '').startswith('debug-'):
+                actions = getattr(pattern.callback, 'actions', {'get': None})
+                yield from ((pattern.name, method.upper()) for method in actions)
+
+    missing = set(routes(get_resolver().url_patterns)) - {(e.url_name, e.method) for e in ENDPOINTS}
+    if missing:
+        raise SystemExit(f'no load for {sorted(missing, key=str)}, add them to ENDPOINTS')
+
+
+def label(endpoint: Endpoint) -> str:
+    return f'{endpoint.method} {endpoint.url_name or "status"}'
+
+
+def load(base_url: str, users: List[User], concurrency: int, duration: float) -> dict:
+    """
+    concurrent clients going round the endpoints until the deadline
+    {endpoint label: ([latency], {status: count})}
+    """
+    def client(n: int) -> dict:
+        user = users[n % len(users)]
+        results: dict = {label(endpoint): ([], {}) for endpoint in ENDPOINTS}
+        deadline = time.time() + duration
+        i = n
+        while time.time() < deadline:
+            endpoint = ENDPOINTS[i % len(ENDPOINTS)]
+            i += 1
+            prepared = endpoint.request(user)
+            if prepared is None:
+                continue
+            path, body, *headers = prepared
+            request = urllib.request.Request(
+                base_url + path, method=endpoint.method,
+                headers={'Authorization': user.auth, **dict(*headers)},
+                data=json.dumps(body).encode() if body is not None else None)
+            if body is not None:
+                request.add_header('Content-Type', 'application/json')
+
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                    code = response.status
+            except urllib.error.HTTPError as error:
+                code = error.code
+            except (OSError, http.client.HTTPException):
+                # no (complete) response: refused / reset connection, timeout...
+                code = NO_RESPONSE
+            latencies, codes = results[label(endpoint)]
+            latencies.append(time.perf_counter() - start)
+            codes[code] = codes.get(code, 0) + 1
+        return results
+
+    merged: dict = {label(endpoint): ([], {}) for endpoint in ENDPOINTS}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for results in executor.map(client, range(concurrency)):
+            for key, (latencies, codes) in results.items():
+                merged[key][0].extend(latencies)
+                for code, count in codes.items():
+                    merged[key][1][code] = merged[key][1].get(code, 0) + count
+    return merged
+
+
+def percentile(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+def summarize(results: dict, duration: float) -> list:
+    summary = []
+    for key, (latencies, codes) in results.items():
+        ordered = sorted(latencies)
+        summary.append({
+            'endpoint': key,
+            'requests': len(ordered),
+            'errors': sum(count for code, count in codes.items() if code >= 400 or code == NO_RESPONSE),
+            'codes': {str(code): count for code, count in sorted(codes.items())},
+            'rps': len(ordered) / duration,
+            'p50_ms': percentile(ordered, 0.50) * 1000,
+            'p95_ms': percentile(ordered, 0.95) * 1000,
+            'p99_ms': percentile(ordered, 0.99) * 1000,
+        })
+    return summary
+
+
+def print_summary(summary: list) -> None:
+    print(f'{"endpoint":<52}{"requests":>9}{"errors":>8}{"req/s":>9}{"p50 (ms)":>10}{"p95 (ms)":>10}'
+          f'{"p99 (ms)":>10}')
+    for row in summary:
+        print(f'{row["endpoint"]:<52}{row["requests"]:>9}{row["errors"]:>8}{row["rps"]:>9.1f}'
+              f'{row["p50_ms"]:>10.1f}{row["p95_ms"]:>10.1f}{row["p99_ms"]:>10.1f}')
+    print(f'{"total":<52}{sum(row["requests"] for row in summary):>9}'
+          f'{sum(row["errors"] for row in summary):>8}{sum(row["rps"] for row in summary):>9.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sqlite', help='SQLite database file to use instead of the environment postgres '
+                                         '(concurrent writes fail with "database is locked" now and then)')
+    parser.add_argument('--seed', action='store_true', help='migrate and generate fake data before the load')
+    parser.add_argument('--profiles', type=int, default=5000, help='profiles to generate (--seed)')
+    parser.add_argument('--friendships', type=int, default=20000,
+                        help='random friendships to generate (--seed)')
+    parser.add_argument('--invitations', type=int, default=500,
+                        help='received / created invitations and friends to generate for each user (--seed)')
+    parser.add_argument('--users', type=int, default=20, help='profiles making the requests')
+    parser.add_argument('--concurrency', type=int, default=32, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=15, help='seconds of load')
+    parser.add_argument('--warm-up', type=float, default=2, help='seconds of load before measuring')
+    parser.add_argument('--url', help='load an already running service (using the same database) instead')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    setup_django(args.sqlite)
+    check_coverage()
+    if args.seed:
+        seed(args)
+    users = prepare_users(args.users)
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        base_url = f'http://127.0.0.1:{args.port}'
+        server = subprocess.Popen(
+            ['gunicorn', '-c', 'gunicorn.conf.py', 'core.wsgi:application'], cwd=CORE_DIR,
+            env={**os.environ, 'GUNICORN_BIND': f'127.0.0.1:{args.port}'},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(base_url)
+        load(base_url, users, args.concurrency, args.warm_up)
+        summary = summarize(load(base_url, users, args.concurrency, args.duration), args.duration)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_summary(summary)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump({'args': vars(args), 'endpoints': summary}, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
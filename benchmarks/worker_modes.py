@@ -0,0 +1,142 @@
+"""
+Compares gunicorn "sync" and "gthread" workers at a fixed number of worker processes (hence ~fixed memory):
+throughput, latency percentiles and resident memory while concurrent clients hit the read endpoints.
+
+Usage (from the repository root, with the service environment loaded, e.g. inside the web container):
+    python benchmarks/worker_modes.py --uuid <existing profile external_uuid> --workers 2 --threads 8
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+
+CORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'core')
+
+READ_PATHS = ('/profiles/me', '/profiles/{uuid}', '/friends', '/friend_profiles')
+
+
+def mint_token(uuid: str) -> str:
+    """
+    same as t_helpers.profiles.set_up (needs settings with JWT_PRIVATE_KEY, e.g. core.settings.local)
+    """
+    sys.path.insert(0, CORE_DIR)
+    import django
+    django.setup()
+    from rest_framework_jwt.settings import api_settings as jwt_settings
+    return jwt_settings.JWT_ENCODE_HANDLER({'uuid': uuid})
+
+
+def rss_kb(pid: int) -> int:
+    """
+    resident memory of a process and its children
+    """
+    total = 0
+    try:
+        with open(f'/proc/{pid}/status') as fp:
+            total += next(int(line.split()[1]) for line in fp if line.startswith('VmRSS'))
+        with open(f'/proc/{pid}/task/{pid}/children') as fp:
+            total += sum(rss_kb(int(child)) for child in fp.read().split())
+    except (FileNotFoundError, StopIteration):
+        pass
+    return total
+
+
+def wait_until_up(base_url: str, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/', timeout=1)
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError(f'{base_url} did not come up')
+
+
+def load(base_url: str, paths: list, token: str, concurrency: int, duration: float) -> Tuple[list, int]:
+    """
+    latencies of the successful requests and the number of failed ones (4xx / 5xx, connection errors)
+    """
+    headers = {'Authorization': f'JWT {token}'}
+
+    def client(n: int) -> Tuple[list, int]:
+        latencies = []
+        failures = 0
+        deadline = time.time() + duration
+        i = n
+        while time.time() < deadline:
+            request = urllib.request.Request(base_url + paths[i % len(paths)], headers=headers)
+            start = time.perf_counter()
+            try:
+                urllib.request.urlopen(request).read()
+                latencies.append(time.perf_counter() - start)
+            except (urllib.error.URLError, ConnectionError):
+                # HTTPError is a URLError
+                failures += 1
+            i += 1
+        return latencies, failures
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(client, range(concurrency)))
+    latencies = [latency for client_latencies, _ in results for latency in client_latencies]
+    return latencies, sum(failures for _, failures in results)
+
+
+def run_mode(worker_class: str, threads: int, args, token: str) -> dict:
+    env = {
+        **os.environ,
+        'GUNICORN_BIND': f'127.0.0.1:{args.port}',
+        'GUNICORN_WORKERS': str(args.workers),
+        'GUNICORN_WORKER_CLASS': worker_class,
+        'GUNICORN_THREADS': str(threads),
+    }
+    server = subprocess.Popen(
+        ['gunicorn', '-c', 'gunicorn.conf.py', 'core.wsgi:application'],
+        cwd=CORE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{args.port}'
+    try:
+        wait_until_up(base_url)
+        paths = [path.format(uuid=args.uuid) for path in READ_PATHS]
+        load(base_url, paths, token, args.concurrency, 2)  # warm up
+        latencies, errors = load(base_url, paths, token, args.concurrency, args.duration)
+        latencies.sort()
+        return {
+            'mode': f'{worker_class} x{threads}',
+            'rss_mb': rss_kb(server.pid) / 1024,
+            'rps': len(latencies) / args.duration,
+            'errors': errors,
+            'p50_ms': statistics.median(latencies) * 1000 if latencies else 0.0,
+            'p99_ms': latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000 if latencies else 0.0,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uuid', required=True, help='external_uuid of the profile making the requests')
+    parser.add_argument('--workers', type=int, default=2, help='worker processes (same for both modes)')
+    parser.add_argument('--threads', type=int, default=8, help='threads per gthread worker')
+    parser.add_argument('--concurrency', type=int, default=32, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=15, help='seconds of load per mode')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    token = mint_token(args.uuid)
+    results = [run_mode('sync', 1, args, token), run_mode('gthread', args.threads, args, token)]
+
+    print(f'{"mode":<14}{"rss (MB)":>10}{"req/s":>10}{"errors":>8}{"p50 (ms)":>10}{"p99 (ms)":>10}')
+    for result in results:
+        print(f'{result["mode"]:<14}{result["rss_mb"]:>10.1f}{result["rps"]:>10.1f}{result["errors"]:>8}'
+              f'{result["p50_ms"]:>10.1f}{result["p99_ms"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from graph import snapshot
+
+
+class Command(BaseCommand):
+    help = 'Exports the friendship graph to a memory mappable CSR snapshot (see graph.csr), ' \
+           'read by the workers through graph.snapshot.get_graph\n' \
+           'Usage example (e.g. from cron):\n' \
+           './manage.py export_friendship_graph --incremental'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            dest='path',
+            default=settings.FRIENDSHIP_GRAPH_PATH,
+            help="snapshot file (defaults to the FRIENDSHIP_GRAPH_PATH setting)",
+        )
+
+        parser.add_argument(
+            '--incremental',
+            dest='incremental',
+            action='store_true',
+            help="only add the friendships changed since the previous snapshot "
+                 "(a full export is done anyway if friendships were deleted)",
+        )
+
+        parser.add_argument(
+            '--chunk-size',
+            dest='chunk_size',
+            type=int,
+            default=10000,
+            help="rows fetched per round trip on full exports",
+        )
+
+    def handle(self, *args, **kwargs):
+        """
+        Command entry point
+        """
+        if not kwargs['path']:
+            raise CommandError('no snapshot path, set FRIENDSHIP_GRAPH_PATH or use --path')
+
+        kind, graph = snapshot.export(kwargs['path'], kwargs['incremental'], kwargs['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(graph)} friendships exported ({kind}, generation {graph.generation}, '
+            f'up to {snapshot.from_stamp(graph.stamp).isoformat()}).'))
@@ -1,32 +1,75 @@
+import random
+import time
 import uuid
-from typing import Optional, List
+from array import array
+from typing import Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from django.db import IntegrityError
+from django.db import transaction
 from faker import Faker
 
 from profiles.models import Profile
-from friendships.models import FriendshipInvitation
+from friendships import counters
+from friendships.models import Friendship, FriendshipInvitation
 
 
 class SomethingWentWrongException(Exception):
     pass
 
 
+def chunks(items: Sequence, size: int) -> Iterator[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Progress:
+    """
+    Rows written so far and their throughput, one line per chunk
+    """
+
+    def __init__(self, command: 'Command', label: str, total: int) -> None:
+        self.command = command
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.started = time.perf_counter()
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.done / elapsed if elapsed else 0.0
+
+    def advance(self, n: int) -> None:
+        self.done += n
+        if self.command.verbosity > 1:
+            self.command.stdout.write(f'{self.label}: {self.done}/{self.total} ({self.rate:.0f} rows/s)')
+
+    def finish(self) -> None:
+        elapsed = time.perf_counter() - self.started
+        self.command.print_success(
+            f'{self.done} {self.label} generated in {elapsed:.2f}s ({self.rate:.0f} rows/s)'
+        )
+
+
 class Command(BaseCommand):
     help = 'Generates fake data for development purposes\n' \
            'Usage example:\n' \
-           './manage.py generate_fake_data -v 3 --profiles 100 --heroes 2 --invited_f 5\n' \
+           './manage.py generate_fake_data -v 3 --profiles 100 --heroes 2 --invited_f 5 ' \
+           '--friendships 1000\n' \
            'This would create 100 new Profile items, ' \
            'find the Profile with id=2 (hero),' \
-           'create 5 FriendshipInvitation with hero as invited'
+           'create 5 FriendshipInvitation with hero as invited ' \
+           'and 1000 Friendships between random profiles'
+
+    verbosity = 1
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--heroes',
             dest='heroes',
             nargs='+',
+            type=int,
             help="Tag profiles as heroes using their id. "
                  "Heroes are the target special operations and are never deleted"
         )
@@ -52,6 +95,28 @@ class Command(BaseCommand):
             help="number of friendship invitations to generate for each hero as the invited Profile",
         )
 
+        parser.add_argument(
+            '--friends',
+            dest='friends',
+            type=int,
+            help="number of friendships to generate for each hero",
+        )
+
+        parser.add_argument(
+            '--friendships',
+            dest='friendships',
+            type=int,
+            help="number of friendships to generate between random profiles",
+        )
+
+        parser.add_argument(
+            '--chunk-size',
+            dest='chunk_size',
+            type=int,
+            default=1000,
+            help="number of rows written per INSERT",
+        )
+
         parser.add_argument(
             '--force',
             dest='force',
@@ -76,76 +141,145 @@ class Command(BaseCommand):
         if isinstance(hero_ids, list):
             self.print_success(f"Finding heroes with ids {hero_ids}")
             heroes = list(Profile.objects.filter(id__in=hero_ids))
-            if len(heroes) != len(hero_ids):
+            if len(heroes) != len(set(hero_ids)):
                 self.print_error("Failed to find at least one hero. Aborting")
                 raise SomethingWentWrongException
             else:
                 self.print_success(f"Heroes found!")
         return heroes
 
-    def generate_profiles(self, n: Optional[int]) -> None:
+    def generate_profiles(self, n: Optional[int], chunk_size: int) -> None:
         """
         Generates new Profiles with random uuid and name
         """
         if isinstance(n, int):
             self.print_success(f"Generating {n} new Profiles")
             faker = Faker()
-            Profile.objects.bulk_create(
-                [Profile(external_uuid=uuid.uuid4().hex, name=faker.name()) for _ in range(n)]
-            )
-            self.print_success(f"New Profiles generated!")
+            progress = Progress(self, 'Profiles', n)
+            for start in range(0, n, chunk_size):
+                size = min(chunk_size, n - start)
+                Profile.objects.bulk_create(
+                    [Profile(external_uuid=uuid.uuid4().hex, name=faker.name()) for _ in range(size)]
+                )
+                progress.advance(size)
+            progress.finish()
 
-    def _generate_one_f_invitation(self, hero: Profile, invited: bool, retries=15) -> None:
+    def sample_ids(self, profile_ids: array, n: int, taken: Set[int]) -> List[int]:
         """
-        Recursively tries to create new FriendshipInvitations for a given hero (Profile)
-        tries 15 times before concluding that such FriendshipInvitations is not possible to create
+        n distinct random profile ids, none of them in taken.
+        Picked in memory: by rejection while the free ids are plenty, from the free ids otherwise
         """
-        random_profile = Profile.objects.order_by('?').first()
-        try:
-            if invited:
-                FriendshipInvitation.objects.create(inviting=random_profile, invited=hero)
-            else:
-                FriendshipInvitation.objects.create(inviting=hero, invited=random_profile)
-        except IntegrityError:
-            if retries == 0:
-                # we can be asking for something that is not possible
-                # which will lead us here
-                # (or we were just very unlucky)  ¯\_(ツ)_/¯
-                self.print_error("Unable to create FriendshipInvitations."
-                                 " Is it impossible or were you just unlucky?")
-                raise SomethingWentWrongException
-            self._generate_one_f_invitation(hero, invited, retries - 1)
+        free = len(profile_ids) - len(taken.intersection(profile_ids))
+        if n > free:
+            # we are asking for something that is not possible  ¯\_(ツ)_/¯
+            self.print_error(f"Unable to pick {n} profiles, only {free} are available")
+            raise SomethingWentWrongException
+
+        if n > free // 2:
+            return random.sample([id_ for id_ in profile_ids if id_ not in taken], n)
 
-    def generate_invited_f(self, n: Optional[int], heroes: List[Profile]) -> None:
+        picked: Set[int] = set()
+        while len(picked) < n:
+            id_ = random.choice(profile_ids)
+            if id_ not in taken:
+                picked.add(id_)
+        return list(picked)
+
+    def write_invitations(self, invitations: List[Tuple[int, int]], chunk_size: int,
+                          progress: Progress) -> None:
+        """
+        bulk_creates the (inviting, invited) invitations chunk by chunk, with their profile counters
         """
-        Generates new FriendshipInvitations with (hero as invited)
+        for chunk in chunks(invitations, chunk_size):
+            with transaction.atomic():
+                FriendshipInvitation.objects.bulk_create([
+                    FriendshipInvitation(inviting_id=inviting, invited_id=invited)
+                    for inviting, invited in chunk
+                ])
+                counters.update(counters.invitation_deltas(chunk, 1))
+            progress.advance(len(chunk))
+
+    def generate_invitations(self, n: Optional[int], heroes: List[Profile], profile_ids: array,
+                             chunk_size: int, invited: bool) -> None:
+        """
+        Generates new FriendshipInvitations with (hero as invited) or (hero as inviting)
         """
         if isinstance(n, int):
-            self.print_success(f"Generating {n} new Friendship Invitations (hero as invited)")
+            role = 'invited' if invited else 'inviting'
+            self.print_success(f"Generating {n} new Friendship Invitations (hero as {role})")
+            progress = Progress(self, f'Friendship Invitations (hero as {role})', n * len(heroes))
             for hero in heroes:
-                for _ in range(n):
-                    self._generate_one_f_invitation(hero, True)
-            self.print_success(f"New Friendship Invitations generated (hero as invited)")
+                hero_field, other_field = ('invited', 'inviting') if invited else ('inviting', 'invited')
+                existing = FriendshipInvitation.objects.filter(**{hero_field: hero})
+                existing = existing.values_list(f'{other_field}_id', flat=True)
+                others = self.sample_ids(profile_ids, n, {hero.id, *existing})
+                invitations = [(other, hero.id) if invited else (hero.id, other) for other in others]
+                self.write_invitations(invitations, chunk_size, progress)
+            progress.finish()
+
+    def write_friendships(self, pairs: Iterable[Tuple[int, int]], chunk_size: int, progress: Progress) -> int:
+        """
+        Creates the friendships (see FriendshipManager.create_pairs) chunk by chunk.
+        Returns the number of pairs that did not exist yet
+        """
+        created = 0
+        for chunk in chunks(sorted(pairs), chunk_size):
+            created += len(Friendship.objects.create_pairs(chunk)) // 2
+            progress.advance(len(chunk))
+        return created
 
-    def generate_inviting_f(self, n: Optional[int], heroes: List[Profile]) -> None:
+    def generate_friends(self, n: Optional[int], heroes: List[Profile], profile_ids: array,
+                         chunk_size: int) -> None:
         """
-        Generates new FriendshipInvitations with (hero as inviting)
+        Generates new Friendships for each hero
         """
         if isinstance(n, int):
-            self.print_success(f"Generating {n} new Friendship Invitations (hero as inviting)")
+            self.print_success(f"Generating {n} new Friendships for each hero")
+            progress = Progress(self, 'Friendships (hero)', n * len(heroes))
             for hero in heroes:
-                for _ in range(n):
-                    self._generate_one_f_invitation(hero, False)
-            self.print_success(f"New Friendship Invitations generated (hero as inviting)")
+                existing = Friendship.objects.filter(source=hero).values_list('target_id', flat=True)
+                friends = self.sample_ids(profile_ids, n, {hero.id, *existing})
+                self.write_friendships({(hero.id, friend) for friend in friends}, chunk_size, progress)
+            progress.finish()
+
+    def generate_friendships(self, n: Optional[int], profile_ids: array, chunk_size: int) -> None:
+        """
+        Generates up to n new Friendships between random profiles.
+        Pairs are drawn and deduplicated in memory, pairs that already exist are skipped by the INSERT
+        """
+        if isinstance(n, int):
+            self.print_success(f"Generating {n} new Friendships between random profiles")
+            possible = len(profile_ids) * (len(profile_ids) - 1) // 2
+            if n > possible:
+                self.print_error(f"Unable to pick {n} friendships, only {possible} are possible")
+                raise SomethingWentWrongException
+
+            pairs: Set[Tuple[int, int]] = set()
+            while len(pairs) < n:
+                a, b = random.choice(profile_ids), random.choice(profile_ids)
+                if a != b:
+                    pairs.add((min(a, b), max(a, b)))
+
+            progress = Progress(self, 'Friendships', n)
+            created = self.write_friendships(pairs, chunk_size, progress)
+            progress.finish()
+            if created < n:
+                self.print_warning(f"{n - created} of them already existed")
 
     def generate_fake_data(self, *args, **kwargs):
         """
         Manages item creation
         """
+        chunk_size = kwargs['chunk_size']
         heroes = self.get_heroes(kwargs['heroes'])
-        self.generate_profiles(kwargs['profiles'])
-        self.generate_invited_f(kwargs['invited_f'], heroes)
-        self.generate_inviting_f(kwargs['inviting_f'], heroes)
+        self.generate_profiles(kwargs['profiles'], chunk_size)
+
+        # every random pick is made from this in memory id list (instead of ORDER BY random() queries)
+        profile_ids = array('q', Profile.objects.order_by('id').values_list('id', flat=True))
+        self.generate_invitations(kwargs['invited_f'], heroes, profile_ids, chunk_size, invited=True)
+        self.generate_invitations(kwargs['inviting_f'], heroes, profile_ids, chunk_size, invited=False)
+        self.generate_friends(kwargs['friends'], heroes, profile_ids, chunk_size)
+        self.generate_friendships(kwargs['friendships'], profile_ids, chunk_size)
 
     def print_input(self, **kwargs):
         """
@@ -160,15 +294,16 @@ class Command(BaseCommand):
         """
         Command entry point
         """
+        self.verbosity = kwargs['verbosity']
         self.print_input(**kwargs)
-        self.print_success(kwargs['force'])
-        if not settings.DEBUG:
+        if not settings.DEBUG and not kwargs['force']:
             self.print_error("This command is for development only. Use --force if you want to run it anyway")
         else:
             try:
                 self.print_success('Starting...')
+                started = time.perf_counter()
                 self.generate_fake_data(**kwargs)
-                self.print_success('Finished successfully.')
+                self.print_success(f'Finished successfully in {time.perf_counter() - started:.2f}s.')
             # we will be raising generic exceptions for now, this is a dev command
             except SomethingWentWrongException:
                 self.print_error('Aborted.')
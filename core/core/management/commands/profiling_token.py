@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from profiling import profiler
+
+
+class Command(BaseCommand):
+    help = 'Prints a value for the X-Profile request header, having that request profiled ' \
+           '(see profiling.middleware, valid PROFILING_TOKEN_MAX_AGE seconds)\n' \
+           'Usage example:\n' \
+           'curl -H "X-Profile: $(./manage.py profiling_token)" ...'
+
+    def handle(self, *args, **kwargs):
+        """
+        Command entry point
+        """
+        self.stdout.write(profiler.make_token())
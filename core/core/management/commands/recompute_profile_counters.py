@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from profiles.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the denormalized Profile counters ' \
+           '(friend_count, received_invitation_count, sent_invitation_count) from the friendships tables\n' \
+           'Usage example:\n' \
+           './manage.py recompute_profile_counters --batch-size 10000'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            default=10000,
+            help="number of profiles (by id range) recomputed per UPDATE",
+        )
+
+    def handle(self, *args, **kwargs):
+        """
+        Command entry point
+        """
+        batch_size = kwargs['batch_size']
+        max_id = Profile.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+
+        updated = 0
+        for id_from in range(0, max_id + 1, batch_size):
+            updated += Profile.objects.recompute_counters(id_from, id_from + batch_size)
+            if kwargs['verbosity'] > 1:
+                self.stdout.write(f'{updated} profiles recomputed (up to id {id_from + batch_size - 1})')
+
+        self.stdout.write(self.style.SUCCESS(f'{updated} profiles recomputed.'))
@@ -6,6 +6,9 @@ ALLOWED_HOSTS = [
     '0.0.0.0'
 ]
 
+PROFILING_DIR = os.getenv('DJANGO_PROFILING_DIR', '/tmp/core_profiles')  # noqa: F405
+PROFILING_LISTING = True
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 EMAIL_HOST = 'localhost'
 EMAIL_PORT = 1025
@@ -1,8 +1,15 @@
+import datetime
 import os
+from io import StringIO
 
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from rest_framework.test import APITestCase
 from rest_framework import status
 
+from profiles.models import Profile
+from friendships.models import Friendship, FriendshipInvitation, FriendshipPair
+
 
 class TestStatusApi(APITestCase):
     URL = '/'
@@ -19,3 +26,54 @@ class TestStatusApi(APITestCase):
         self.assertEqual(response.data['image'], 'core')
         self.assertEqual(response.data['tag'], os.environ['DOCKER_IMAGE_TAG'])
         self.assertIn('up_time', response.data)
+
+    def test_up_time_past_a_day(self):
+        started = datetime.datetime.now() - datetime.timedelta(days=2, minutes=3)
+        with override_settings(START_DATETIME=started):
+            response = self.client.get(self.URL, format=self.CONTENT_TYPE)
+        self.assertTrue(response.data['up_time'].startswith('48:03:'))
+
+
+class TestGenerateFakeData(TestCase):
+
+    def generate(self, **kwargs) -> str:
+        out = StringIO()
+        call_command('generate_fake_data', force=True, chunk_size=7, stdout=out, **kwargs)
+        return out.getvalue()
+
+    def test_generate(self):
+        out = self.generate(profiles=30)
+        self.assertIn('30 Profiles generated', out)
+        hero = Profile.objects.order_by('id').first()
+
+        out = self.generate(heroes=[hero.id], invited_f=10, inviting_f=12, friends=9, friendships=40)
+        self.assertIn('Finished successfully', out)
+        self.assertEqual(FriendshipInvitation.objects.filter(invited=hero).count(), 10)
+        self.assertEqual(FriendshipInvitation.objects.filter(inviting=hero).count(), 12)
+        self.assertGreaterEqual(Friendship.objects.filter(source=hero).count(), 9)
+        self.assertGreater(FriendshipPair.objects.count(), 9)
+
+        hero.refresh_from_db()
+        self.assertEqual(hero.received_invitation_count, 10)
+        self.assertEqual(hero.sent_invitation_count, 12)
+        self.assertEqual(hero.friend_count, Friendship.objects.filter(source=hero).count())
+
+    def test_dedupe(self):
+        self.generate(profiles=5)
+        hero = Profile.objects.order_by('id').first()
+
+        # every other profile, twice: the second run finds nobody left to invite
+        self.generate(heroes=[hero.id], inviting_f=4)
+        out = self.generate(heroes=[hero.id], inviting_f=1)
+        self.assertIn('Aborted', out)
+        self.assertEqual(FriendshipInvitation.objects.filter(inviting=hero).count(), 4)
+
+        self.generate(friendships=10)
+        self.assertEqual(FriendshipPair.objects.count(), 10)
+        self.assertIn('Aborted', self.generate(friendships=11))
+
+    def test_production_guard(self):
+        out = StringIO()
+        call_command('generate_fake_data', profiles=3, stdout=out)
+        self.assertIn('development only', out.getvalue())
+        self.assertEqual(Profile.objects.count(), 0)
@@ -1,9 +1,14 @@
 from django.urls import path, include
 
-from core.views import status_view
+from core.views import status_view, metrics_view
+from profiling.views import profiles_view, profile_view, profile_dump_view
 
 urlpatterns = [
     path('', status_view),
+    path('metrics', metrics_view, name='metrics'),
+    path('debug/profiles', profiles_view, name='debug-profiles'),
+    path('debug/profiles/<str:name>', profile_view, name='debug-profile'),
+    path('debug/profiles/<str:name>/prof', profile_dump_view, name='debug-profile-dump'),
     path('', include('profiles.urls')),
     path('', include('friendships.urls')),
     path('', include('friend_profiles.urls')),
@@ -2,12 +2,16 @@ import os
 import datetime
 
 from django.conf import settings
+from django.http import HttpResponse
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
 
+from metrics import registry
+from metrics.permissions import HasScrapeToken
+
 
 class StatusView(APIView):
     http_method_names = ['get']
@@ -16,7 +20,8 @@ class StatusView(APIView):
     @staticmethod
     def __calculate_up_time():
         delta = datetime.datetime.now() - settings.START_DATETIME
-        hours, remainder = divmod(delta.seconds, 3600)
+        # hours keep counting past 24 (delta.seconds alone wraps every day)
+        hours, remainder = divmod(int(delta.total_seconds()), 3600)
         minutes, seconds = divmod(remainder, 60)
 
         return '{:02}:{:02}:{:02}'.format(int(hours), int(minutes), int(seconds))
@@ -33,3 +38,20 @@ class StatusView(APIView):
 
 
 status_view = StatusView.as_view()
+
+
+class MetricsView(APIView):
+    """
+    Prometheus metrics of every worker process (see metrics.registry),
+    for scrapers with the METRICS_TOKEN only (not the users' JWTs)
+    """
+    http_method_names = ['get']
+    authentication_classes = ()
+    permission_classes = (HasScrapeToken,)
+
+    def get(self, request, *args, **kwargs):
+        samples = registry.get_registry().collect()
+        return HttpResponse(registry.exposition(samples), content_type=registry.CONTENT_TYPE)
+
+
+metrics_view = MetricsView.as_view()
@@ -0,0 +1,63 @@
+from functools import partial
+
+from django.db.backends.postgresql.base import Database, DatabaseWrapper as PostgresDatabaseWrapper
+from django.db.backends.postgresql.creation import DatabaseCreation as PostgresDatabaseCreation
+from psycopg2 import extensions
+
+from .pool import ConnectionPool, PoolTimeout, close_pools, get_pool
+
+
+def check(connection) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def reset(connection) -> None:
+    """
+    roll back whatever a checked out connection left open
+    (raises on broken connections, so they get discarded)
+    """
+    if connection.closed:
+        raise Database.InterfaceError('connection already closed')
+    if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+
+class DatabaseCreation(PostgresDatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # idle pooled connections would keep the test database in use
+        close_pools(lambda key: key[1] == test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    """
+    django.db.backends.postgresql taking connections from a per-process ConnectionPool and giving them back
+    instead of opening / closing them, settings_dict['POOL'] holds the ConnectionPool options
+    """
+    creation_class = DatabaseCreation
+
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool((self.alias, self.settings_dict['NAME']), partial(
+            ConnectionPool,
+            connect=partial(PostgresDatabaseWrapper.get_new_connection, self, conn_params),
+            check=check,
+            reset=reset,
+            **self.settings_dict.get('POOL', {}),
+        ))
+        try:
+            connection = self.pool.getconn()
+        except PoolTimeout as e:
+            raise Database.OperationalError(str(e)) from e
+
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
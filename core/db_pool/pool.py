@@ -0,0 +1,210 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections, at most max_size of them open at a time.
+    Idle connections are health checked (check) before being handed out again if they sat idle for more than
+    check_interval seconds, reset (reset) when given back, and closed instead of reused once older than
+    max_lifetime seconds. A checkout waits up to timeout seconds for a connection when max_size are in use.
+    """
+
+    def __init__(self, connect: Callable[[], Any], min_size: int = 0, max_size: int = 10,
+                 max_lifetime: float = 1800, timeout: float = 5, check_interval: float = 30,
+                 check: Optional[Callable[[Any], Any]] = None, reset: Optional[Callable[[Any], Any]] = None):
+        assert 0 <= min_size <= max_size and max_size > 0, 'expected 0 <= min_size <= max_size, 0 < max_size'
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self._connect = connect
+        self._check = check
+        self._reset = reset
+
+        self._idle: deque = deque()  # (connection, created_at, idle_since), most recently returned last
+        self._created_at: Dict[Any, float] = {}  # every open connection, idle or checked out
+        self._reserved = 0  # connections being opened
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # metrics
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.0  # seconds, summed over checkouts
+        self.max_wait_time = 0.0
+        self.opened = 0
+        self.discarded = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._created_at) + self._reserved
+
+    def fill(self) -> None:
+        """
+        open connections up to min_size
+        """
+        while True:
+            with self._cond:
+                if self.size >= self.min_size:
+                    return
+                self._reserved += 1
+            self.putconn(self._open())
+
+    def getconn(self) -> Any:
+        start = time.monotonic()
+        while True:
+            connection, created_at, idle_since = self._acquire(start + self.timeout)
+            if connection is None:
+                connection = self._open()
+                break
+
+            now = time.monotonic()
+            if now - created_at >= self.max_lifetime:
+                self._discard(connection)
+            elif now - idle_since >= self.check_interval and not self._is_healthy(connection):
+                self._discard(connection)
+            else:
+                break
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+        return connection
+
+    def putconn(self, connection: Any) -> None:
+        with self._cond:
+            created_at = self._created_at.get(connection)
+        if created_at is None or self._closed or time.monotonic() - created_at >= self.max_lifetime:
+            self._discard(connection)
+            return
+
+        try:
+            if self._reset is not None:
+                self._reset(connection)
+        except Exception:
+            self._discard(connection)
+            return
+
+        with self._cond:
+            self._idle.append((connection, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def close(self) -> None:
+        """
+        close idle connections, checked out ones are closed when given back
+        """
+        with self._cond:
+            self._closed = True
+            idle = [connection for connection, _, _ in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': self.size - len(self._idle),
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_time': self.wait_time,
+                'max_wait_time': self.max_wait_time,
+                'opened': self.opened,
+                'discarded': self.discarded,
+            }
+
+    def _acquire(self, deadline: float) -> tuple:
+        """
+        an idle connection, or (None, None, None) with a slot reserved for a new one
+        """
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self.size < self.max_size:
+                    self._reserved += 1
+                    return None, None, None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f'no connection available within {self.timeout}s ({self.max_size} in use)')
+                self._cond.wait(remaining)
+
+    def _open(self) -> Any:
+        try:
+            connection = self._connect()
+        except Exception:
+            with self._cond:
+                self._reserved -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._reserved -= 1
+            self._created_at[connection] = time.monotonic()
+            self.opened += 1
+        return connection
+
+    def _is_healthy(self, connection: Any) -> bool:
+        try:
+            if self._check is not None:
+                self._check(connection)
+        except Exception:
+            return False
+        return True
+
+    def _discard(self, connection: Any) -> None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+        with self._cond:
+            if self._created_at.pop(connection, None) is not None:
+                self.discarded += 1
+            self._cond.notify()
+
+
+# (database alias, database name)
+PoolKey = Tuple[str, str]
+
+pools: Dict[PoolKey, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key: PoolKey, factory: Callable[[], ConnectionPool]) -> ConnectionPool:
+    """
+    the per-process pool for key, created (and filled up to min_size) by factory on first use
+    """
+    with _pools_lock:
+        pool = pools.get(key)
+        if pool is None:
+            pool = pools[key] = factory()
+    pool.fill()
+    return pool
+
+
+def close_pools(match: Callable[[PoolKey], bool] = lambda key: True) -> None:
+    with _pools_lock:
+        keys = [key for key in pools if match(key)]
+        closing = [pools.pop(key) for key in keys]
+    for pool in closing:
+        pool.close()
+
+
+def stats() -> Dict[PoolKey, dict]:
+    with _pools_lock:
+        return {key: pool.stats() for key, pool in pools.items()}
@@ -0,0 +1,119 @@
+import threading
+import time
+
+from django.test import TestCase
+
+from . import pool as pools
+from .pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+        self.healthy = True
+
+    def close(self):
+        self.closed = True
+
+
+def check(connection):
+    if not connection.healthy:
+        raise ConnectionError()
+
+
+class TestConnectionPool(TestCase):
+
+    def setUp(self):
+        self.pool = ConnectionPool(connect=FakeConnection, max_size=2, timeout=0.05, check=check)
+
+    def test_reuse(self):
+        connection = self.pool.getconn()
+        self.pool.putconn(connection)
+        self.assertIs(self.pool.getconn(), connection)
+        self.assertEqual(self.pool.stats()['checkouts'], 2)
+        self.assertEqual(self.pool.stats()['opened'], 1)
+
+    def test_min_size(self):
+        pool = ConnectionPool(connect=FakeConnection, min_size=2, max_size=3)
+        pool.fill()
+        self.assertEqual(pool.stats()['idle'], 2)
+        self.assertEqual(pool.stats()['opened'], 2)
+
+    def test_max_size_timeout(self):
+        self.pool.getconn()
+        self.pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            self.pool.getconn()
+        stats = self.pool.stats()
+        self.assertEqual((stats['size'], stats['in_use'], stats['timeouts']), (2, 2, 1))
+
+    def test_waits_for_putconn(self):
+        pool = ConnectionPool(connect=FakeConnection, max_size=1, timeout=5)
+        connection = pool.getconn()
+        threading.Timer(0.05, pool.putconn, args=(connection,)).start()
+        self.assertIs(pool.getconn(), connection)
+        self.assertGreater(pool.stats()['wait_time'], 0)
+
+    def test_health_check(self):
+        pool = ConnectionPool(connect=FakeConnection, check_interval=0, check=check)
+        connection = pool.getconn()
+        connection.healthy = False
+        pool.putconn(connection)
+        self.assertIsNot(pool.getconn(), connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+    def test_max_lifetime(self):
+        pool = ConnectionPool(connect=FakeConnection, max_lifetime=0.01)
+        connection = pool.getconn()
+        time.sleep(0.01)
+        pool.putconn(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_reset_failure(self):
+        def reset(connection):
+            raise ConnectionError()
+
+        pool = ConnectionPool(connect=FakeConnection, reset=reset)
+        connection = pool.getconn()
+        pool.putconn(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_connect_failure_frees_slot(self):
+        def connect():
+            raise ConnectionError()
+
+        pool = ConnectionPool(connect=connect, max_size=1, timeout=0)
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                pool.getconn()
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_close(self):
+        idle, checked_out = self.pool.getconn(), self.pool.getconn()
+        self.pool.putconn(idle)
+        self.pool.close()
+        self.assertTrue(idle.closed)
+        self.assertFalse(checked_out.closed)
+        self.pool.putconn(checked_out)
+        self.assertTrue(checked_out.closed)
+
+
+class TestPools(TestCase):
+
+    def tearDown(self):
+        pools.close_pools()
+
+    def test_get_pool(self):
+        pool = pools.get_pool(('default', 'a'), lambda: ConnectionPool(connect=FakeConnection, min_size=1))
+        self.assertIs(pools.get_pool(('default', 'a'), lambda: None), pool)
+        self.assertEqual(pools.stats()[('default', 'a')]['idle'], 1)
+
+    def test_close_pools(self):
+        pools.get_pool(('default', 'a'), lambda: ConnectionPool(connect=FakeConnection))
+        pools.get_pool(('default', 'b'), lambda: ConnectionPool(connect=FakeConnection))
+        pools.close_pools(lambda key: key[1] == 'a')
+        self.assertEqual(list(pools.stats()), [('default', 'b')])
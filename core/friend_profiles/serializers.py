@@ -10,6 +10,10 @@ class ProfileIsFriendSerializer(ProfileSerializer):
     is_friend = serializers.SerializerMethodField()
 
     def get_has_friend_invitation(self, profile: Profile) -> bool:
+        # annotated by FriendProfilesViewSet.get_queryset
+        if hasattr(profile, 'has_friend_invitation'):
+            return profile.has_friend_invitation
+
         is_friend = False
         if 'request' in self.context and self.context['request'].user is not None:
             is_friend = FriendshipInvitation.objects.filter(
@@ -20,6 +24,10 @@ class ProfileIsFriendSerializer(ProfileSerializer):
         return is_friend
 
     def get_is_friend(self, profile: Profile) -> bool:
+        # annotated by FriendProfilesViewSet.get_queryset
+        if hasattr(profile, 'is_friend'):
+            return profile.is_friend
+
         is_friend = False
         if 'request' in self.context and self.context['request'].user is not None:
             is_friend = Friendship.objects.filter(
@@ -32,3 +40,32 @@ class ProfileIsFriendSerializer(ProfileSerializer):
     class Meta:
         model = ProfileSerializer.Meta.model
         fields = ProfileSerializer.Meta.fields + ('has_friend_invitation', 'is_friend')
+
+
+class ProfileRelationshipSerializer(ProfileIsFriendSerializer):
+    has_received_friend_invitation = serializers.SerializerMethodField()
+
+    def get_has_received_friend_invitation(self, profile: Profile) -> bool:
+        # annotated by FriendProfilesViewSet.get_queryset
+        if hasattr(profile, 'has_received_friend_invitation'):
+            return profile.has_received_friend_invitation
+
+        has_received = False
+        if 'request' in self.context and self.context['request'].user is not None:
+            has_received = FriendshipInvitation.objects.filter(
+                inviting=profile,
+                invited=self.context['request'].user,
+            ).exists()
+
+        return has_received
+
+    class Meta:
+        model = ProfileIsFriendSerializer.Meta.model
+        fields = ProfileIsFriendSerializer.Meta.fields + ('has_received_friend_invitation',)
+
+
+class RelationshipsSerializer(serializers.Serializer):
+    MAX_UUIDS = 500
+
+    uuids = serializers.ListField(
+        child=serializers.UUIDField(format='hex'), min_length=1, max_length=MAX_UUIDS, write_only=True)
@@ -1,10 +1,13 @@
+import json
+import uuid
+
 from django.test import TestCase
 from rest_framework.test import APITestCase
 
 from t_helpers.profiles import set_up as profiles_set_up
 from profiles.models import Profile
 from friendships.models import FriendshipInvitation, Friendship
-from .serializers import ProfileIsFriendSerializer
+from .serializers import ProfileIsFriendSerializer, RelationshipsSerializer
 
 
 class TestProfileIsFriendSerializer(TestCase):
@@ -81,3 +84,66 @@ class TestProfileIsFriendApi(APITestCase):
         self.assertIsNone(response.json()['next'])
         self.assertIsNone(response.json()['previous'])
         self.assertEqual(response.json()['count'], 0)
+
+    def test_list_200_constant_queries(self):
+        for i in range(0, 10):
+            profile = Profile.objects.create(external_uuid=str(i), name=f'dummy_{i}')
+            Friendship.objects.create(source=self.joao, target=profile)
+
+        # authentication + count + page
+        with self.assertNumQueries(3):
+            response = self.client.get(self.URL, **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(result['is_friend'] for result in response.json()['results'][:10]))
+
+
+class TestRelationshipsApi(APITestCase):
+    URL = '/friend_profiles/relationships'
+    CONTENT_TYPE = 'application/json'
+
+    def setUp(self):
+        profile_set_up = profiles_set_up()
+        self.vasco, self.chi, self.joao = profile_set_up.profiles
+        self.http_auth = profile_set_up.http_auth
+        self.dummy = Profile.objects.create(external_uuid=uuid.uuid4().hex, name='dummy')
+
+        Friendship.objects.create(source=self.joao, target=self.vasco)
+        FriendshipInvitation.objects.create(inviting=self.joao, invited=self.chi)
+        FriendshipInvitation.objects.create(inviting=self.dummy, invited=self.joao)
+
+    def post(self, data: dict, **kwargs):
+        return self.client.post(self.URL, data=json.dumps(data), content_type=self.CONTENT_TYPE, **kwargs)
+
+    def test_401(self):
+        response = self.post({'uuids': [self.vasco.external_uuid]})
+        self.assertEqual(response.status_code, 401)
+
+    def test_400(self):
+        response = self.post({}, **self.http_auth)
+        self.assertEqual(response.status_code, 400)
+        response = self.post({'uuids': []}, **self.http_auth)
+        self.assertEqual(response.status_code, 400)
+        response = self.post({'uuids': ['not a uuid']}, **self.http_auth)
+        self.assertEqual(response.status_code, 400)
+        too_many = [uuid.uuid4().hex for _ in range(RelationshipsSerializer.MAX_UUIDS + 1)]
+        response = self.post({'uuids': too_many}, **self.http_auth)
+        self.assertEqual(response.status_code, 400)
+
+    def test_200(self):
+        uuids = [profile.external_uuid for profile in (self.vasco, self.chi, self.joao, self.dummy)]
+        uuids.append(uuid.uuid4().hex)
+
+        # authentication + relationships
+        with self.assertNumQueries(2):
+            response = self.post({'uuids': uuids}, **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+
+        relationships = {item['uuid']: item for item in response.json()}
+        self.assertEqual(len(relationships), 3)
+        self.assertEqual(
+            [(item['is_friend'], item['has_friend_invitation'], item['has_received_friend_invitation'])
+             for item in (relationships[self.vasco.external_uuid],
+                          relationships[self.chi.external_uuid],
+                          relationships[self.dummy.external_uuid])],
+            [(True, False, False), (False, True, False), (False, False, True)]
+        )
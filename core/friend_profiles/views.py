@@ -1,23 +1,53 @@
+from django.db.models import Exists, OuterRef
 from rest_framework.viewsets import GenericViewSet
 from rest_framework.mixins import ListModelMixin
-from rest_framework.filters import SearchFilter
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
 from generics.permissions import IsAuthenticated
+from replicas.mixins import ReplicaReadMixin
+from shared.filters import TrigramSearchFilter
 from profiles.models import Profile
-from .serializers import ProfileIsFriendSerializer
+from friendships.models import FriendshipInvitation, Friendship
+from .serializers import ProfileIsFriendSerializer, ProfileRelationshipSerializer, RelationshipsSerializer
 
 
-class FriendProfilesViewSet(ListModelMixin, GenericViewSet):
+class FriendProfilesViewSet(ReplicaReadMixin, ListModelMixin, GenericViewSet):
 
     model_class = Profile
     serializer_class = ProfileIsFriendSerializer
+    relationships_serializer_class = RelationshipsSerializer
+    relationship_serializer_class = ProfileRelationshipSerializer
     permission_classes = (IsAuthenticated,)
-    filter_backends = (SearchFilter,)
+    filter_backends = (TrigramSearchFilter,)
     search_fields = ('name',)
+    replica_read_actions = ('relationships',)
 
     def get_queryset(self):
         """
         Exclude the user making the request from results
+        is_friend and has_friend_invitation are annotated so a whole page is resolved in a single query
         """
         user = self.request.user
-        return self.model_class.objects.exclude(id=user.id)
+        return self.model_class.objects.exclude(id=user.id).annotate(
+            is_friend=Exists(Friendship.objects.filter(source=user, target=OuterRef('pk'))),
+            has_friend_invitation=Exists(
+                FriendshipInvitation.objects.filter(inviting=user, invited=OuterRef('pk'))),
+        )
+
+    @action(methods=('post',), detail=False)
+    def relationships(self, request, *args, **kwargs):
+        """
+        Relationship status (is_friend, has_friend_invitation, has_received_friend_invitation)
+        of the user with each of the given profiles, resolved by a single query.
+        Unknown uuids (and the user's own) are left out.
+        """
+        serializer = self.relationships_serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        uuids = [uuid.hex for uuid in serializer.validated_data['uuids']]
+
+        queryset = self.get_queryset().filter(external_uuid__in=uuids).annotate(
+            has_received_friend_invitation=Exists(
+                FriendshipInvitation.objects.filter(inviting=OuterRef('pk'), invited=request.user)),
+        )
+        return Response(self.relationship_serializer_class(queryset, many=True).data)
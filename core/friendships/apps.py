@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class FriendshipsConfig(AppConfig):
+    name = 'friendships'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,40 @@
+from collections import Counter
+from typing import Dict, Iterable, Tuple
+
+from profiles.models import Profile
+
+
+def _deltas(profile_ids: Iterable[int], delta: int) -> Dict[int, int]:
+    return {profile_id: n * delta for profile_id, n in Counter(profile_ids).items()}
+
+
+def friendship_deltas(sources: Iterable[int], delta: int) -> Dict[str, Dict[int, int]]:
+    """
+    Profile.friend_count deltas for the source of every created (delta=1) / deleted (delta=-1) Friendship
+    """
+    return {
+        'friend_count': _deltas(sources, delta),
+    }
+
+
+def invitation_deltas(invitations: Iterable[Tuple[int, int]], delta: int) -> Dict[str, Dict[int, int]]:
+    """
+    Profile.sent_invitation_count and Profile.received_invitation_count deltas
+    for every created (delta=1) / deleted (delta=-1) (inviting, invited) FriendshipInvitation
+    """
+    invitations = list(invitations)
+    return {
+        'sent_invitation_count': _deltas((inviting for inviting, _ in invitations), delta),
+        'received_invitation_count': _deltas((invited for _, invited in invitations), delta),
+    }
+
+
+def update(*deltas: Dict[str, Dict[int, int]]) -> None:
+    """
+    Applies friendship_deltas / invitation_deltas (as one Profile.objects.update_counters call)
+    """
+    merged: dict = {}
+    for counter_deltas in deltas:
+        for counter, profile_deltas in counter_deltas.items():
+            merged.setdefault(counter, Counter()).update(profile_deltas)
+    Profile.objects.update_counters(**merged)
@@ -0,0 +1,173 @@
+from collections import defaultdict
+from typing import Iterable, List, Tuple
+
+from django.db import models, connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import counters
+
+
+def both_ways(pairs: Iterable[Tuple[int, int]], a_field: str, b_field: str) -> Q:
+    """
+    (a, b) rows and their reverse (b, a) rows,
+    grouped by b so many pairs that share a profile (a batch) stay a two clauses predicate
+    """
+    a_by_b: dict = defaultdict(set)
+    for a, b in pairs:
+        a_by_b[b].add(a)
+
+    condition = Q()
+    for b, a_ids in a_by_b.items():
+        condition |= Q(**{b_field: b, f'{a_field}__in': a_ids})
+        condition |= Q(**{a_field: b, f'{b_field}__in': a_ids})
+    return condition
+
+
+class FriendshipManager(models.Manager):
+    """
+    Friendship is a read only view, friendships are written as FriendshipPair rows
+    """
+
+    @property
+    def pair_model(self):
+        return self.model._meta.apps.get_model('friendships', 'FriendshipPair')
+
+    def create_pairs(self, pairs: Iterable[Tuple[int, int]],
+                     update_counters: bool = True) -> List[Tuple[int, int]]:
+        """
+        Creates the friendship (both directions, a -> b and b -> a) of every (a, b) profile id pair
+        with a single INSERT per batch, friendships that already exist are left untouched.
+        Returns the inserted (source, target) directions, whose profiles get their friend_count updated
+        (unless the caller takes care of it, see counters.friendship_deltas).
+
+        (bulk_create(ignore_conflicts=True) is not available before django 2.2)
+        """
+        pair_model = self.pair_model
+        connection = connections[router.db_for_write(pair_model)]
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+        rows = [(low, high, now, now) for low, high in sorted({tuple(sorted(pair)) for pair in pairs})]
+        if not rows:
+            return []
+
+        opts = pair_model._meta
+        qn = connection.ops.quote_name
+        fields = [opts.get_field(name) for name in ('low', 'high', 'created_at', 'updated_at')]
+        columns = ', '.join(qn(field.column) for field in fields)
+        unique_columns = ', '.join(qn(field.column) for field in fields[:2])
+        batch_size = max(connection.ops.bulk_batch_size(fields, rows), 1)
+
+        inserted: list = []
+        with transaction.atomic(using=connection.alias, savepoint=False), connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                values = ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+                cursor.execute(
+                    f'INSERT INTO {qn(opts.db_table)} ({columns}) VALUES {values} '
+                    f'ON CONFLICT ({unique_columns}) DO NOTHING '
+                    f'RETURNING {unique_columns}',
+                    [value for row in batch for value in row],
+                )
+                for low, high in cursor.fetchall():
+                    inserted.extend(((low, high), (high, low)))
+
+            if update_counters:
+                counters.update(counters.friendship_deltas((source for source, _ in inserted), 1))
+        return inserted
+
+    def delete_pairs(self, pairs: Iterable[Tuple[int, int]]) -> int:
+        """
+        Deletes the friendship (both directions) of every (a, b) profile id pair with a single DELETE,
+        the profiles get their friend_count updated.
+        Returns the number of deleted friendships.
+        """
+        highs_by_low: dict = defaultdict(set)
+        for a, b in pairs:
+            low, high = sorted((a, b))
+            highs_by_low[low].add(high)
+        condition = Q()
+        for low, highs in highs_by_low.items():
+            condition |= Q(low_id=low, high_id__in=highs)
+
+        pair_model = self.pair_model
+        with transaction.atomic(using=router.db_for_write(pair_model), savepoint=False):
+            rows = list(
+                pair_model.objects.filter(condition)
+                .select_for_update().order_by('id').values_list('id', 'low_id', 'high_id'))
+            if not rows:
+                return 0
+
+            pair_model.objects.filter(id__in=[id_ for id_, _, _ in rows]).delete()
+            sources = [source for _, low, high in rows for source in (low, high)]
+            counters.update(counters.friendship_deltas(sources, -1))
+        return len(rows)
+
+
+class FriendshipInvitationQuerySet(models.QuerySet):
+
+    def create_invitations(self, inviting_id: int, invited_ids: Iterable[int]) -> None:
+        """
+        Creates the (inviting, invited) invitations with a single bulk_create,
+        the profiles get their invitation counters updated
+        """
+        invitations = [(inviting_id, invited_id) for invited_id in invited_ids]
+        with transaction.atomic(using=self.db, savepoint=False):
+            self.bulk_create([
+                self.model(inviting_id=inviting_id, invited_id=invited_id) for _, invited_id in invitations
+            ])
+            counters.update(counters.invitation_deltas(invitations, 1))
+
+    def decline(self) -> int:
+        """
+        Deletes every invite in the queryset with a single DELETE,
+        the profiles get their invitation counters updated.
+        Returns the number of deleted invites.
+        """
+        with transaction.atomic(using=self.db, savepoint=False):
+            locked = self.select_for_update().order_by('id')
+            rows = list(locked.values_list('id', 'inviting_id', 'invited_id'))
+            if not rows:
+                return 0
+
+            self.model.objects.filter(id__in=[id_ for id_, _, _ in rows]).delete()
+            counters.update(counters.invitation_deltas(((a, b) for _, a, b in rows), -1))
+        return len(rows)
+
+    def accept(self) -> int:
+        """
+        Accepts every invite in the queryset with a constant number of statements, in a single transaction:
+        the invites and their reverse invites are locked (in id order, so concurrent accepts
+        of an invite and its reverse can not deadlock), the friendship of every invite is inserted
+        by one statement and all invites (and reverse invites) are deleted by one statement.
+        Invites that are already gone (accepted or deleted concurrently) are skipped.
+        The profiles get their friend and invitation counters updated.
+        Returns the number of accepted invites.
+        """
+        friendship_model = self.model._meta.apps.get_model('friendships', 'Friendship')
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            invites = list(self.order_by().values_list('id', 'inviting_id', 'invited_id'))
+            if not invites:
+                return 0
+
+            candidates = both_ways(((a, b) for _, a, b in invites), 'inviting_id', 'invited_id')
+            locked = list(
+                self.model.objects.filter(candidates)
+                .select_for_update().order_by('id').values_list('id', 'inviting_id', 'invited_id'))
+            locked_ids = {id_ for id_, _, _ in locked}
+            pairs = [(a, b) for id_, a, b in invites if id_ in locked_ids]
+            if not pairs:
+                return 0
+
+            accepted = set(pairs) | {(b, a) for a, b in pairs}
+            deleted = [(a, b) for id_, a, b in locked if (a, b) in accepted]
+
+            inserted = friendship_model.objects.create_pairs(pairs, update_counters=False)
+            self.model.objects.filter(both_ways(pairs, 'inviting_id', 'invited_id')).delete()
+            counters.update(
+                counters.friendship_deltas((source for source, _ in inserted), 1),
+                counters.invitation_deltas(deleted, -1),
+            )
+
+        return len(pairs)
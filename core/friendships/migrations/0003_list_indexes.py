@@ -0,0 +1,25 @@
+# Generated by Django 2.1.4 on 2026-10-18 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('friendships', '0002_auto_20181207_2215'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['source', '-updated_at', 'id'], name='friendship_source_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendshipinvitation',
+            index=models.Index(fields=['invited', '-updated_at', 'id'], name='invitation_invited_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendshipinvitation',
+            index=models.Index(fields=['inviting', '-updated_at', 'id'], name='invitation_inviting_list_idx'),
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 2.1.4 on 2026-10-18 18:23
+
+from django.core.management.color import no_style
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# every row has its own id (the Friendship primary key):
+# 2 * pair id for low -> high, 2 * pair id + 1 for high -> low
+FRIENDSHIP_VIEW = '''
+CREATE VIEW friendships_friendship AS
+SELECT id * 2 AS id, low_id AS source_id, high_id AS target_id, updated_at, created_at
+FROM friendships_friendshippair
+UNION ALL
+SELECT id * 2 + 1 AS id, high_id AS source_id, low_id AS target_id, updated_at, created_at
+FROM friendships_friendshippair
+'''
+
+
+def collapse_pairs(apps, schema_editor):
+    """
+    one FriendshipPair per (a, b) / (b, a) Friendship rows, keeping the id of the oldest row
+    """
+    friendship = apps.get_model('friendships', 'Friendship')._meta.db_table
+    pair_model = apps.get_model('friendships', 'FriendshipPair')
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {pair_model._meta.db_table} (id, low_id, high_id, updated_at, created_at) '
+            f'SELECT MIN(id), low_id, high_id, MAX(updated_at), MIN(created_at) FROM ('
+            f'  SELECT id, updated_at, created_at,'
+            f'    CASE WHEN source_id < target_id THEN source_id ELSE target_id END AS low_id,'
+            f'    CASE WHEN source_id < target_id THEN target_id ELSE source_id END AS high_id'
+            f'  FROM {friendship}'
+            f') AS directed GROUP BY low_id, high_id'
+        )
+        for sql in connection.ops.sequence_reset_sql(no_style(), [pair_model]):
+            cursor.execute(sql)
+
+
+def expand_pairs(apps, schema_editor):
+    friendship = apps.get_model('friendships', 'Friendship')._meta.db_table
+    pairs = apps.get_model('friendships', 'FriendshipPair')._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        for source, target in (('low_id', 'high_id'), ('high_id', 'low_id')):
+            cursor.execute(
+                f'INSERT INTO {friendship} (source_id, target_id, updated_at, created_at) '
+                f'SELECT {source}, {target}, updated_at, created_at FROM {pairs}'
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0003_counters'),
+        ('friendships', '0003_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendshipPair',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('high', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='profiles.Profile')),
+                ('low', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='profiles.Profile')),
+            ],
+            options={
+                'ordering': ('-updated_at',),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='friendshippair',
+            unique_together={('low', 'high')},
+        ),
+        migrations.AddIndex(
+            model_name='friendshippair',
+            index=models.Index(fields=['low', '-updated_at', 'id'], name='friendship_pair_low_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendshippair',
+            index=models.Index(fields=['high', '-updated_at', 'id'], name='friendship_pair_high_list_idx'),
+        ),
+        migrations.RunPython(collapse_pairs, expand_pairs),
+        migrations.DeleteModel(
+            name='Friendship',
+        ),
+        migrations.CreateModel(
+            name='Friendship',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('source', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='friend_source', to='profiles.Profile')),
+                ('target', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='friend_target', to='profiles.Profile')),
+            ],
+            options={
+                'db_table': 'friendships_friendship',
+                'ordering': ('-updated_at',),
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL([FRIENDSHIP_VIEW], ['DROP VIEW friendships_friendship']),
+    ]
@@ -1,39 +1,87 @@
-from django.core.exceptions import ObjectDoesNotExist
 from django.db import models, IntegrityError
 from generics.models import Base, Invitation
+from .managers import FriendshipManager, FriendshipInvitationQuerySet
 
 
 class FriendshipInvitation(Invitation):
 
+    objects = FriendshipInvitationQuerySet.as_manager()
+
     def accept(self) -> None:
         """
         creates a Friendships for both profiles the invite (invting and invited)
         deletes invite and reverse invite if exists
 
+        atomic and safe under concurrent accepts, see FriendshipInvitationQuerySet.accept
         """
-        Friendship.objects.get_or_create(source=self.inviting, target=self.invited)
-        Friendship.objects.get_or_create(source=self.invited, target=self.inviting)
-        try:
-            reverse_invite = FriendshipInvitation.objects.get(inviting=self.invited, invited=self.inviting)
-            reverse_invite.delete()
-        except ObjectDoesNotExist:
-            pass
-        self.delete()
+        FriendshipInvitation.objects.filter(id=self.id).accept()
+
+    class Meta(Invitation.Meta):
+        # list orderings (see views keyset_ordering), a page is an index range scan instead of a sort
+        indexes = [
+            models.Index(fields=['invited', '-updated_at', 'id'], name='invitation_invited_list_idx'),
+            models.Index(fields=['inviting', '-updated_at', 'id'], name='invitation_inviting_list_idx'),
+        ]
+
+
+class FriendshipPair(Base):
+    """
+    A friendship, stored once: low is the smaller profile id, high the bigger one
+    (both directions are read through the Friendship view)
+    """
+    low = models.ForeignKey(to='profiles.Profile', on_delete=models.CASCADE, null=False,
+                            related_name='+', db_index=False)
+
+    high = models.ForeignKey(to='profiles.Profile', on_delete=models.CASCADE, null=False,
+                             related_name='+', db_index=False)
+
+    def save(self, *args, **kwargs):
+        if not self.low_id < self.high_id:
+            raise IntegrityError('low must be smaller than high')
+        super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ('-updated_at',)
+        unique_together = ('low', 'high')
+        # the Friendship view lists (see views keyset_ordering) are merged range scans of these two
+        indexes = [
+            models.Index(fields=['low', '-updated_at', 'id'], name='friendship_pair_low_list_idx'),
+            models.Index(fields=['high', '-updated_at', 'id'], name='friendship_pair_high_list_idx'),
+        ]
 
 
 class Friendship(Base):
-    source = models.ForeignKey(to='profiles.Profile', on_delete=models.CASCADE, null=False,
-                               related_name='friend_source')
+    """
+    Directed read model: a database view with two rows for every FriendshipPair,
+    low -> high (id: 2 * pair id) and high -> low (id: 2 * pair id + 1),
+    so "friends of" is still a filter on source.
+    Write through FriendshipManager.create_pairs / delete_pairs (or save / delete, without counters)
+    """
+    source = models.ForeignKey(to='profiles.Profile', on_delete=models.DO_NOTHING, null=False,
+                               related_name='friend_source', db_constraint=False)
+
+    target = models.ForeignKey(to='profiles.Profile', on_delete=models.DO_NOTHING, null=False,
+                               related_name='friend_target', db_constraint=False)
 
-    target = models.ForeignKey(to='profiles.Profile', on_delete=models.CASCADE, null=False,
-                               related_name='friend_target')
+    objects = FriendshipManager()
 
     def save(self, *args, **kwargs):
         # No self friendships!
-        if self.source == self.target:
+        if self.source_id == self.target_id:
             raise IntegrityError('inviting and invited can not be the same')
-        super().save(*args, **kwargs)
+        if self.pk is not None:
+            raise IntegrityError('friendships can only be created or deleted')
+
+        low, high = sorted((self.source_id, self.target_id))
+        pair = FriendshipPair.objects.create(low_id=low, high_id=high)
+        self.pk = pair.pk * 2 + (self.source_id > self.target_id)
+        self.created_at, self.updated_at = pair.created_at, pair.updated_at
+
+    def delete(self, *args, **kwargs):
+        # the reverse friendship goes too
+        return FriendshipPair.objects.filter(id=self.pk // 2).delete()
 
     class Meta:
+        managed = False
+        db_table = 'friendships_friendship'
         ordering = ('-updated_at',)
-        unique_together = ('source', 'target')
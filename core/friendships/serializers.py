@@ -1,13 +1,16 @@
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction, IntegrityError
 from rest_framework import serializers
 
 from profiles.serializers import ProfileSerializer
 from profiles.models import Profile
+from timing.mixins import TimedSerializerMixin
 
+from . import counters
 from .models import FriendshipInvitation, Friendship
 
 
-class ReceivedFriendshipInvitationSerializer(serializers.ModelSerializer):
+class ReceivedFriendshipInvitationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     friend = ProfileSerializer(many=False, read_only=True, source='inviting')
 
     class Meta:
@@ -15,7 +18,24 @@ class ReceivedFriendshipInvitationSerializer(serializers.ModelSerializer):
         fields = ('id', 'friend')
 
 
-class CreatedFriendshipInvitationSerializer(serializers.ModelSerializer):
+class BatchReceivedFriendshipInvitationSerializer(serializers.Serializer):
+    """
+    Selects received invitations for batch accept / decline: either a list of ids or all of them
+    """
+    MAX_IDS = 1000
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), min_length=1, max_length=MAX_IDS, required=False, write_only=True)
+    all = serializers.BooleanField(default=False, write_only=True)
+
+    def validate(self, data):
+        if data['all'] == ('ids' in data):
+            raise serializers.ValidationError("Provide either ids or all.")
+
+        return data
+
+
+class CreatedFriendshipInvitationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     friend = ProfileSerializer(many=False, read_only=True, source='invited')
     friend_uuid = serializers.UUIDField(write_only=True, format='hex')
 
@@ -36,14 +56,90 @@ class CreatedFriendshipInvitationSerializer(serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
-        return self.Meta.model.objects.create(**validated_data)
+        with transaction.atomic(savepoint=False):
+            instance = self.Meta.model.objects.create(**validated_data)
+            counters.update(counters.invitation_deltas([(instance.inviting_id, instance.invited_id)], 1))
+        return instance
 
     class Meta:
         model = FriendshipInvitation
         fields = ('id', 'friend', 'friend_uuid')
 
 
-class FriendshipSerializer(serializers.ModelSerializer):
+class BatchCreatedFriendshipInvitationSerializer(serializers.Serializer):
+    """
+    Invites many profiles at once with a constant number of queries:
+    profiles, friendships and existing invitations are each resolved by a single query,
+    the new invitations are inserted by a single bulk_create.
+    save() returns a result ({'friend_uuid', 'status', 'id'}) for each (distinct) friend_uuid
+    """
+    MAX_FRIEND_UUIDS = 500
+
+    CREATED = 'created'
+    NOT_FOUND = 'not_found'
+    SELF = 'self'
+    ALREADY_FRIEND = 'already_friend'
+    ALREADY_INVITED = 'already_invited'
+
+    friend_uuids = serializers.ListField(
+        child=serializers.UUIDField(format='hex'), min_length=1, max_length=MAX_FRIEND_UUIDS, write_only=True)
+
+    def validate(self, data):
+        inviting = self.context['request'].user
+        friend_uuids = list(dict.fromkeys(friend_uuid.hex for friend_uuid in data['friend_uuids']))
+
+        invited_ids = dict(
+            Profile.objects.filter(external_uuid__in=friend_uuids).values_list('external_uuid', 'id'))
+        friend_ids = set(
+            Friendship.objects.filter(source=inviting, target_id__in=invited_ids.values())
+            .values_list('target_id', flat=True))
+        invitation_ids = dict(
+            FriendshipInvitation.objects.filter(inviting=inviting, invited_id__in=invited_ids.values())
+            .values_list('invited_id', 'id'))
+
+        results = []
+        for friend_uuid in friend_uuids:
+            invited_id = invited_ids.get(friend_uuid)
+            result = {'friend_uuid': friend_uuid, 'status': self.CREATED, 'id': None}
+            if invited_id is None:
+                result['status'] = self.NOT_FOUND
+            elif invited_id == inviting.id:
+                result['status'] = self.SELF
+            elif invited_id in friend_ids:
+                result['status'] = self.ALREADY_FRIEND
+            elif invited_id in invitation_ids:
+                result.update(status=self.ALREADY_INVITED, id=invitation_ids[invited_id])
+            results.append((result, invited_id))
+
+        return {
+            'inviting': inviting,
+            'results': results,
+        }
+
+    def create(self, validated_data):
+        inviting = validated_data['inviting']
+        results = validated_data['results']
+        to_invite = [invited_id for result, invited_id in results if result['status'] == self.CREATED]
+
+        if to_invite:
+            try:
+                with transaction.atomic():
+                    FriendshipInvitation.objects.create_invitations(inviting.id, to_invite)
+            except IntegrityError:
+                raise serializers.ValidationError("Some profiles were invited concurrently, try again.")
+
+            # bulk_create only sets primary keys on PostgreSQL
+            created_ids = dict(
+                FriendshipInvitation.objects.filter(inviting=inviting, invited_id__in=to_invite)
+                .values_list('invited_id', 'id'))
+            for result, invited_id in results:
+                if result['status'] == self.CREATED:
+                    result['id'] = created_ids[invited_id]
+
+        return [result for result, _ in results]
+
+
+class FriendshipSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     friend = ProfileSerializer(many=False, read_only=True, source='target')
 
     class Meta:
@@ -0,0 +1,21 @@
+from django.db.models import Q
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from profiles.models import Profile
+from . import counters
+from .models import FriendshipInvitation, Friendship
+
+
+@receiver(pre_delete, sender=Profile)
+def update_counters_on_profile_delete(sender, instance: Profile, **kwargs):
+    """
+    Friendships and invitations of a deleted profile are cascade deleted (no counters involved),
+    the counters of the profiles on the other side are updated here
+    """
+    friend_ids = Friendship.objects.filter(source=instance).values_list('target_id', flat=True)
+    invitations = FriendshipInvitation.objects.filter(Q(inviting=instance) | Q(invited=instance))
+    counters.update(
+        counters.friendship_deltas(friend_ids, -1),
+        counters.invitation_deltas(invitations.values_list('inviting_id', 'invited_id'), -1),
+    )
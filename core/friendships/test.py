@@ -1,12 +1,16 @@
 import json
+import uuid
+from io import StringIO
 
+from django.core.management import call_command
 from django.test import TestCase
 from django.db import IntegrityError
 from rest_framework.test import APITestCase
 
 from t_helpers.profiles import set_up as profiles_set_up
 from t_helpers.mixin401 import TMixin401
-from .models import FriendshipInvitation, Friendship
+from profiles.models import Profile
+from .models import FriendshipInvitation, Friendship, FriendshipPair
 from .serializers import (
     ReceivedFriendshipInvitationSerializer, CreatedFriendshipInvitationSerializer, FriendshipSerializer)
 
@@ -61,6 +65,23 @@ class TestFriendshipInvitations(TestCase):
         self.assertEqual(Friendship.objects.filter(source=self.vasco, target=self.chi).count(), 1)
         self.assertEqual(Friendship.objects.filter(source=self.chi, target=self.vasco).count(), 1)
 
+    def test_accept_set_based(self):
+        # select + lock + insert + delete + counters (same deltas for both profiles) + cache invalidation
+        with self.assertNumQueries(6):
+            self.vasco_chi.accept()
+        self.assertEqual(FriendshipInvitation.objects.count(), 0)
+        self.assertEqual(Friendship.objects.count(), 2)
+
+    def test_accept_gone(self):
+        self.chi_vasco.accept()
+        self.vasco_chi.accept()
+        self.assertEqual(FriendshipInvitation.objects.count(), 0)
+        self.assertEqual(Friendship.objects.count(), 2)
+
+        FriendshipPair.objects.all().delete()
+        self.vasco_chi.accept()
+        self.assertEqual(Friendship.objects.count(), 0)
+
 
 class TestFriendship(TestCase):
     """
@@ -69,19 +90,42 @@ class TestFriendship(TestCase):
 
     def setUp(self):
         profile_set_up = profiles_set_up()
-        self.vasco, self.chi, _ = profile_set_up.profiles
+        self.vasco, self.chi, self.joao = profile_set_up.profiles
 
         self.vasco_chi = Friendship.objects.create(source=self.vasco, target=self.chi)
-        self.chi_vasco = Friendship.objects.create(source=self.chi, target=self.vasco)
+
+    def test_both_directions(self):
+        chi_vasco = Friendship.objects.get(source=self.chi, target=self.vasco)
+        self.assertNotEqual(chi_vasco, self.vasco_chi)
+        self.assertEqual(Friendship.objects.count(), 2)
+        pair_id = FriendshipPair.objects.get().id
+        self.assertEqual({self.vasco_chi.id, chi_vasco.id}, {pair_id * 2, pair_id * 2 + 1})
+        # one row per primary key
+        self.assertEqual(Friendship.objects.get(pk=chi_vasco.pk).source, self.chi)
+        self.assertEqual(Friendship.objects.get(pk=self.vasco_chi.pk).source, self.vasco)
 
     def test_ordering(self):
-        items = Friendship.objects.all()
-        self.assertEqual(list(items), [self.chi_vasco, self.vasco_chi])
+        vasco_joao = Friendship.objects.create(source=self.vasco, target=self.joao)
+        items = Friendship.objects.filter(source=self.vasco)
+        self.assertEqual(list(items), [vasco_joao, self.vasco_chi])
 
     def test_unique_together(self):
         with self.assertRaises(IntegrityError):
             Friendship.objects.create(source=self.vasco, target=self.chi)
 
+    def test_unique_together_reverse(self):
+        with self.assertRaises(IntegrityError):
+            Friendship.objects.create(source=self.chi, target=self.vasco)
+
+    def test_pair_order(self):
+        low, high = sorted((self.vasco, self.joao), key=lambda profile: profile.id)
+        with self.assertRaises(IntegrityError):
+            FriendshipPair.objects.create(low=high, high=low)
+
+    def test_delete(self):
+        Friendship.objects.get(source=self.chi).delete()
+        self.assertEqual(Friendship.objects.count(), 0)
+
     def test_delete_cascaded(self):
         self.assertEqual(Friendship.objects.count(), 2)
         self.vasco.delete()
@@ -235,8 +279,84 @@ class TestReceivedFriendshipInvitationsApi(APITestCase, TMixin401):
         self.assertEqual(Friendship.objects.count(), 2)
 
 
+class TestBatchReceivedFriendshipInvitationsApi(APITestCase):
+    URL = '/received_friend_invitations'
+    CONTENT_TYPE = 'application/json'
+
+    def setUp(self):
+        profile_set_up = profiles_set_up()
+        self.vasco, self.chi, self.joao = profile_set_up.profiles
+        self.http_auth = profile_set_up.http_auth
+
+        self.dummies = [Profile.objects.create(external_uuid=str(i), name=f'dummy_{i}') for i in range(0, 10)]
+        self.invitations = [
+            FriendshipInvitation.objects.create(inviting=dummy, invited=self.joao) for dummy in self.dummies]
+        # reverse invite, removed on accept
+        FriendshipInvitation.objects.create(inviting=self.joao, invited=self.dummies[0])
+        # not joao's
+        self.chi_vasco_invitation = FriendshipInvitation.objects.create(inviting=self.chi, invited=self.vasco)
+
+    def post(self, action: str, data: dict):
+        return self.client.post(
+            f'{self.URL}/{action}', data=json.dumps(data), content_type=self.CONTENT_TYPE, **self.http_auth)
+
+    def test_400(self):
+        for action in ('batch_accept', 'batch_decline'):
+            self.assertEqual(self.post(action, {}).status_code, 400)
+            self.assertEqual(self.post(action, {'ids': [1], 'all': True}).status_code, 400)
+            self.assertEqual(self.post(action, {'ids': []}).status_code, 400)
+
+    def test_batch_accept_ids(self):
+        ids = [invitation.id for invitation in self.invitations[:5]] + [self.chi_vasco_invitation.id]
+
+        # authentication + select + lock + insert + delete
+        # + counters (joao, inviters, the inviter with a reverse invite) + cache invalidation
+        with self.assertNumQueries(9):
+            response = self.post('batch_accept', {'ids': ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'accepted': 5})
+
+        self.assertEqual(Friendship.objects.count(), 10)
+        self.assertEqual(
+            set(Friendship.objects.filter(source=self.joao).values_list('target_id', flat=True)),
+            {dummy.id for dummy in self.dummies[:5]})
+        self.assertEqual(FriendshipInvitation.objects.filter(invited=self.joao).count(), 5)
+        self.assertEqual(FriendshipInvitation.objects.filter(inviting=self.joao).count(), 0)
+        self.assertTrue(FriendshipInvitation.objects.filter(id=self.chi_vasco_invitation.id).exists())
+
+    def test_batch_accept_all(self):
+        with self.assertNumQueries(9):
+            response = self.post('batch_accept', {'all': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'accepted': 10})
+        self.assertEqual(Friendship.objects.count(), 20)
+        self.assertEqual(FriendshipInvitation.objects.count(), 1)
+
+        response = self.post('batch_accept', {'all': True})
+        self.assertEqual(response.json(), {'accepted': 0})
+
+    def test_batch_decline_ids(self):
+        ids = [invitation.id for invitation in self.invitations[:5]] + [self.chi_vasco_invitation.id]
+
+        # authentication + lock + delete + counters (joao, inviters) + cache invalidation
+        with self.assertNumQueries(6):
+            response = self.post('batch_decline', {'ids': ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'declined': 5})
+        self.assertEqual(FriendshipInvitation.objects.filter(invited=self.joao).count(), 5)
+        self.assertEqual(Friendship.objects.count(), 0)
+
+    def test_batch_decline_all(self):
+        response = self.post('batch_decline', {'all': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'declined': 10})
+        self.assertEqual(FriendshipInvitation.objects.filter(invited=self.joao).count(), 0)
+        self.assertEqual(FriendshipInvitation.objects.count(), 2)
+
+
 class TestCreatedFriendshipInvitationsApi(APITestCase, TMixin401):
     URL = '/created_friend_invitations'
+    BATCH_URL = f'{URL}/batch'
     CONTENT_TYPE = 'application/json'
 
     model_class = FriendshipInvitation
@@ -383,6 +503,47 @@ class TestCreatedFriendshipInvitationsApi(APITestCase, TMixin401):
         self.assertEqual(new_invitation.inviting, self.joao)
         self.assertEqual(new_invitation.invited, self.chi)
 
+    def test_batch_400(self):
+        response = self.client.post(
+            self.BATCH_URL, data=json.dumps({'friend_uuids': []}),
+            content_type=self.CONTENT_TYPE, **self.http_auth)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('friend_uuids', response.json())
+
+        response = self.client.post(
+            self.BATCH_URL, data=json.dumps({'friend_uuids': ['abc']}),
+            content_type=self.CONTENT_TYPE, **self.http_auth)
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_200(self):
+        Friendship.objects.create(source=self.joao, target=self.chi)
+        dummies = [
+            Profile.objects.create(external_uuid=uuid.uuid4().hex, name=f'dummy_{i}') for i in range(0, 5)]
+        unknown_uuid = uuid.uuid4().hex
+        friend_uuids = [self.vasco.uuid, self.chi.uuid, self.joao.uuid, unknown_uuid] + \
+            [dummy.uuid for dummy in dummies] + [dummies[0].uuid]
+
+        # authentication + profiles + friendships + invitations
+        # + savepoint + insert + counters (joao, invited) + cache invalidation + release + created ids
+        with self.assertNumQueries(11):
+            response = self.client.post(
+                self.BATCH_URL, data=json.dumps({'friend_uuids': friend_uuids}),
+                content_type=self.CONTENT_TYPE, **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+
+        results = response.json()
+        self.assertEqual(len(results), 9)
+        self.assertEqual([result['friend_uuid'] for result in results], friend_uuids[:-1])
+        self.assertEqual(
+            [result['status'] for result in results],
+            ['already_invited', 'already_friend', 'self', 'not_found'] + ['created'] * 5
+        )
+        self.assertEqual(results[0]['id'], self.joao_vasco_inivitation.id)
+        for dummy, result in zip(dummies, results[4:]):
+            invitation = self.model_class.objects.get(id=result['id'])
+            self.assertEqual((invitation.inviting, invitation.invited), (self.joao, dummy))
+        self.assertEqual(self.model_class.objects.filter(inviting=self.joao).count(), 6)
+
     def test_update_405(self):
         response = self.client.put(self.instance_url(self.joao_vasco_inivitation),
                                    data=json.dumps({}), content_type=self.CONTENT_TYPE, **self.http_auth)
@@ -430,9 +591,7 @@ class TestFriendshipsApi(APITestCase, TMixin401):
         self.joao_vasco_friendship = self.instance = self.model_class.objects.create(
             source=self.joao, target=self.vasco
         )
-        self.vasco_joao_friendship = self.model_class.objects.create(
-            source=self.vasco, target=self.joao
-        )
+        self.vasco_joao_friendship = self.model_class.objects.get(source=self.vasco, target=self.joao)
         self.chi_vasco_friendship = self.model_class.objects.create(
             source=self.chi, target=self.vasco
         )
@@ -448,12 +607,12 @@ class TestFriendshipsApi(APITestCase, TMixin401):
         self.assertEqual(response.status_code, 405)
 
     def test_retrieve_404(self):
-        response = self.client.get(self.instance_url(self.vasco_joao_friendship),
+        response = self.client.get(self.instance_url(self.chi_vasco_friendship),
                                    content_type=self.CONTENT_TYPE, **self.http_auth)
         self.assertEqual(response.status_code, 404)
 
     def test_destroy_404(self):
-        response = self.client.delete(self.instance_url(self.vasco_joao_friendship),
+        response = self.client.delete(self.instance_url(self.chi_vasco_friendship),
                                       content_type=self.CONTENT_TYPE, **self.http_auth)
         self.assertEqual(response.status_code, 404)
 
@@ -466,7 +625,7 @@ class TestFriendshipsApi(APITestCase, TMixin401):
         self.assertEqual(response.status_code, 200)
         self.assertIsNone(response.json()['next'])
         self.assertIsNone(response.json()['previous'])
-        self.assertEqual(self.model_class.objects.count(), 3)
+        self.assertEqual(self.model_class.objects.count(), 4)
         self.assertEqual(response.json()['count'], 1)
         self.assertEqual(
             response.json()['results'],
@@ -483,7 +642,7 @@ class TestFriendshipsApi(APITestCase, TMixin401):
         self.assertEqual(response.status_code, 200)
         self.assertIsNone(response.json()['next'])
         self.assertIsNone(response.json()['previous'])
-        self.assertEqual(self.model_class.objects.count(), 4)
+        self.assertEqual(self.model_class.objects.count(), 6)
         self.assertEqual(response.json()['count'], 2)
         self.assertEqual(
             response.json()['results'],
@@ -517,23 +676,96 @@ class TestFriendshipsApi(APITestCase, TMixin401):
 
     def test_destroy_204(self):
         self.assertEqual(self.model_class.objects.filter(source=self.joao).count(), 1)
-        self.assertEqual(self.model_class.objects.filter(source=self.vasco).count(), 1)
+        self.assertEqual(self.model_class.objects.filter(source=self.vasco).count(), 2)
 
         response = self.client.delete(self.instance_url(self.joao_vasco_friendship),
                                       content_type=self.CONTENT_TYPE, **self.http_auth)
         self.assertEqual(response.status_code, 204)
         # it deletes both friendships!
         self.assertEqual(self.model_class.objects.filter(source=self.joao).count(), 0)
-        self.assertEqual(self.model_class.objects.filter(source=self.vasco).count(), 0)
+        self.assertEqual(self.model_class.objects.filter(source=self.vasco).count(), 1)
 
-    def test_destroy_204_partial(self):
-        self.vasco_joao_friendship.delete()
-        self.assertEqual(self.model_class.objects.filter(source=self.joao).count(), 1)
-        self.assertEqual(self.model_class.objects.filter(source=self.vasco).count(), 0)
+    def test_destroy_204_single_row(self):
+        self.assertEqual(FriendshipPair.objects.count(), 2)
 
         response = self.client.delete(self.instance_url(self.joao_vasco_friendship),
                                       content_type=self.CONTENT_TYPE, **self.http_auth)
         self.assertEqual(response.status_code, 204)
-        # deletes only one friendship, does not crash!
-        self.assertEqual(self.model_class.objects.filter(source=self.joao).count(), 0)
-        self.assertEqual(self.model_class.objects.filter(source=self.vasco).count(), 0)
+        # one row held both friendships
+        self.assertEqual(FriendshipPair.objects.count(), 1)
+        self.assertEqual(self.model_class.objects.filter(source=self.chi).count(), 1)
+
+
+class TestProfileCounters(APITestCase):
+    CONTENT_TYPE = 'application/json'
+
+    def setUp(self):
+        profile_set_up = profiles_set_up()
+        self.vasco, self.chi, self.joao = profile_set_up.profiles
+        self.http_auth = profile_set_up.http_auth
+
+    def assertCounters(self, profile: Profile, friend_count: int, received: int, sent: int):
+        profile.refresh_from_db()
+        self.assertEqual(
+            (profile.friend_count, profile.received_invitation_count, profile.sent_invitation_count),
+            (friend_count, received, sent))
+
+    def test_invitation_create_destroy(self):
+        response = self.client.post(
+            '/created_friend_invitations', data=json.dumps({'friend_uuid': self.chi.uuid}),
+            content_type=self.CONTENT_TYPE, **self.http_auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertCounters(self.joao, 0, 0, 1)
+        self.assertCounters(self.chi, 0, 1, 0)
+
+        invitation_id = response.json()['id']
+        response = self.client.delete(f'/created_friend_invitations/{invitation_id}', **self.http_auth)
+        self.assertEqual(response.status_code, 204)
+        self.assertCounters(self.joao, 0, 0, 0)
+        self.assertCounters(self.chi, 0, 0, 0)
+
+    def test_accept_and_unfriend(self):
+        response = self.client.post(
+            '/created_friend_invitations/batch',
+            data=json.dumps({'friend_uuids': [self.chi.uuid, self.vasco.uuid]}),
+            content_type=self.CONTENT_TYPE, **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertCounters(self.joao, 0, 0, 2)
+        self.assertCounters(self.chi, 0, 1, 0)
+
+        FriendshipInvitation.objects.get(inviting=self.joao, invited=self.chi).accept()
+        self.assertCounters(self.joao, 1, 0, 1)
+        self.assertCounters(self.chi, 1, 0, 0)
+
+        friendship = Friendship.objects.get(source=self.joao, target=self.chi)
+        response = self.client.delete(f'/friends/{friendship.id}', **self.http_auth)
+        self.assertEqual(response.status_code, 204)
+        self.assertCounters(self.joao, 0, 0, 1)
+        self.assertCounters(self.chi, 0, 0, 0)
+
+    def test_profile_delete(self):
+        Friendship.objects.create_pairs([(self.joao.id, self.chi.id)])
+        FriendshipInvitation.objects.create_invitations(self.joao.id, [self.vasco.id])
+        self.assertCounters(self.vasco, 0, 1, 0)
+
+        self.joao.delete()
+        self.assertCounters(self.chi, 0, 0, 0)
+        self.assertCounters(self.vasco, 0, 0, 0)
+
+    def test_serialized(self):
+        Friendship.objects.create_pairs([(self.joao.id, self.chi.id)])
+        response = self.client.get('/profiles/me', **self.http_auth)
+        self.assertEqual(response.json()['friend_count'], 1)
+
+    def test_recompute_command(self):
+        Friendship.objects.create(source=self.joao, target=self.chi)
+        FriendshipInvitation.objects.create(inviting=self.vasco, invited=self.joao)
+        FriendshipInvitation.objects.create(inviting=self.vasco, invited=self.chi)
+        Profile.objects.filter(id=self.chi.id).update(received_invitation_count=7)
+
+        out = StringIO()
+        call_command('recompute_profile_counters', batch_size=2, stdout=out)
+        self.assertIn('3 profiles recomputed.', out.getvalue())
+        self.assertCounters(self.joao, 1, 1, 0)
+        self.assertCounters(self.chi, 1, 1, 0)
+        self.assertCounters(self.vasco, 0, 0, 2)
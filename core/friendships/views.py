@@ -1,32 +1,59 @@
-from django.core.exceptions import ObjectDoesNotExist
 from rest_framework.viewsets import GenericViewSet
 from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, ListModelMixin
-from rest_framework.filters import SearchFilter
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.status import HTTP_204_NO_CONTENT
+from rest_framework.status import HTTP_200_OK, HTTP_204_NO_CONTENT
 
 from generics.permissions import IsAuthenticated
+from replicas.mixins import ReplicaReadMixin
+from shared.conditional import ConditionalGetMixin
+from shared.filters import TrigramSearchFilter
+from shared.pagination import KeysetPagination
 from .models import FriendshipInvitation, Friendship
 from .serializers import (
     ReceivedFriendshipInvitationSerializer,
+    BatchReceivedFriendshipInvitationSerializer,
     CreatedFriendshipInvitationSerializer,
+    BatchCreatedFriendshipInvitationSerializer,
     FriendshipSerializer
 )
 
 
-class ReceivedFriendshipInvitationViewSet(RetrieveModelMixin, DestroyModelMixin,
-                                          ListModelMixin, GenericViewSet):
+class ReceivedFriendshipInvitationViewSet(ReplicaReadMixin, ConditionalGetMixin, RetrieveModelMixin,
+                                          DestroyModelMixin, ListModelMixin, GenericViewSet):
 
     model_class = FriendshipInvitation
     serializer_class = ReceivedFriendshipInvitationSerializer
+    batch_serializer_class = BatchReceivedFriendshipInvitationSerializer
     permission_classes = (IsAuthenticated,)
-    filter_backends = (SearchFilter,)
+    filter_backends = (TrigramSearchFilter,)
     search_fields = ('inviting__name',)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-updated_at', 'id')
+    etag_fields = ('updated_at', 'inviting__updated_at')
 
     def get_queryset(self):
         user = self.request.user
-        return self.model_class.objects.filter(invited=user)
+        # the serialized friend (ProfileSerializer) comes with the page instead of one query per row
+        return self.model_class.objects.filter(invited=user).select_related('inviting')
+
+    def get_serializer_class(self):
+        if self.action in ('batch_accept', 'batch_decline'):
+            return self.batch_serializer_class
+
+        return self.serializer_class
+
+    def get_batch_queryset(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        queryset = self.get_queryset()
+        if not serializer.validated_data['all']:
+            queryset = queryset.filter(id__in=serializer.validated_data['ids'])
+        return queryset
+
+    def perform_destroy(self, instance):
+        self.model_class.objects.filter(id=instance.id).decline()
 
     @action(methods=('post',), detail=True)
     def accept(self, request, *args, **kwargs):
@@ -34,38 +61,74 @@ class ReceivedFriendshipInvitationViewSet(RetrieveModelMixin, DestroyModelMixin,
         instance.accept()
         return Response(status=HTTP_204_NO_CONTENT)
 
+    @action(methods=('post',), detail=False)
+    def batch_accept(self, request, *args, **kwargs):
+        """
+        Accepts the given (or all) received invitations with a constant number of statements
+        """
+        accepted = self.get_batch_queryset(request).accept()
+        return Response({'accepted': accepted}, status=HTTP_200_OK)
+
+    @action(methods=('post',), detail=False)
+    def batch_decline(self, request, *args, **kwargs):
+        """
+        Deletes the given (or all) received invitations with a constant number of statements
+        """
+        declined = self.get_batch_queryset(request).decline()
+        return Response({'declined': declined}, status=HTTP_200_OK)
 
-class CreatedFriendshipInvitationViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin,
-                                         ListModelMixin, GenericViewSet):
+
+class CreatedFriendshipInvitationViewSet(ReplicaReadMixin, ConditionalGetMixin, CreateModelMixin,
+                                         RetrieveModelMixin, DestroyModelMixin, ListModelMixin,
+                                         GenericViewSet):
 
     model_class = FriendshipInvitation
     serializer_class = CreatedFriendshipInvitationSerializer
+    batch_serializer_class = BatchCreatedFriendshipInvitationSerializer
     permission_classes = (IsAuthenticated,)
-    filter_backends = (SearchFilter,)
+    filter_backends = (TrigramSearchFilter,)
     search_fields = ('invited__name',)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-updated_at', 'id')
+    etag_fields = ('updated_at', 'invited__updated_at')
 
     def get_queryset(self):
         user = self.request.user
-        return self.model_class.objects.filter(inviting=user)
+        return self.model_class.objects.filter(inviting=user).select_related('invited')
+
+    def perform_destroy(self, instance):
+        self.model_class.objects.filter(id=instance.id).decline()
+
+    def get_serializer_class(self):
+        if self.action == 'batch':
+            return self.batch_serializer_class
 
+        return self.serializer_class
 
-class FriendshipViewSet(RetrieveModelMixin, DestroyModelMixin, ListModelMixin, GenericViewSet):
+    @action(methods=('post',), detail=False)
+    def batch(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        return Response(results, status=HTTP_200_OK)
+
+
+class FriendshipViewSet(ReplicaReadMixin, ConditionalGetMixin, RetrieveModelMixin, DestroyModelMixin,
+                        ListModelMixin, GenericViewSet):
 
     model_class = Friendship
     serializer_class = FriendshipSerializer
     permission_classes = (IsAuthenticated,)
-    filter_backends = (SearchFilter,)
+    filter_backends = (TrigramSearchFilter,)
     search_fields = ('target__name',)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-updated_at', 'id')
+    etag_fields = ('updated_at', 'target__updated_at')
 
     def get_queryset(self):
         user = self.request.user
-        return self.model_class.objects.filter(source=user)
+        return self.model_class.objects.filter(source=user).select_related('target')
 
     def perform_destroy(self, instance):
-        try:
-            reverse_instance = self.model_class.objects.get(source=instance.target, target=instance.source)
-            reverse_instance.delete()
-        except ObjectDoesNotExist:
-            pass  # no longer exists, its ok..
-
-        instance.delete()
+        # one FriendshipPair row, the reverse friendship goes too
+        self.model_class.objects.delete_pairs([(instance.source_id, instance.target_id)])
@@ -0,0 +1,108 @@
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, Tuple
+
+MAGIC = b'FHCSR\x00\x00\x01'
+
+# magic, generation, nodes, neighbours, stamp (max FriendshipPair.updated_at, epoch microseconds)
+HEADER = struct.Struct('<8sQQQq')
+# offsets (uint64, nodes + 1 of them) and neighbours (uint32) follow the header, in native byte order
+OFFSETS_AT = 8 * ((HEADER.size + 7) // 8)
+
+
+def build(edges: Iterable[Tuple[int, int]]) -> Tuple[array, array]:
+    """
+    CSR (offsets, neighbours) arrays from (source, target) edges sorted by source then target:
+    the neighbours of node n are neighbours[offsets[n]:offsets[n + 1]], sorted
+    """
+    offsets = array('Q')
+    neighbours = array('I')
+    for source, target in edges:
+        while len(offsets) <= source:
+            offsets.append(len(neighbours))
+        neighbours.append(target)
+    offsets.append(len(neighbours))
+    return offsets, neighbours
+
+
+def write(path: str, offsets: array, neighbours: array, generation: int, stamp: int) -> None:
+    """
+    atomically replaces path, readers that mapped the previous file keep reading it until they reopen
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.csr-')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(HEADER.pack(MAGIC, generation, len(offsets) - 1, len(neighbours), stamp))
+            fp.write(bytes(OFFSETS_AT - HEADER.size))
+            offsets.tofile(fp)
+            neighbours.tofile(fp)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class FriendshipGraph:
+    """
+    Read only, memory mapped CSR snapshot: the pages are shared by every process mapping the same file
+    (see core.management.commands.export_friendship_graph)
+    """
+
+    def __init__(self, path: str):
+        assert sys.byteorder == 'little', 'snapshots are little endian'
+        self.path = path
+        with open(path, 'rb') as fp:
+            self.stat = os.fstat(fp.fileno())
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.generation, self.nodes, size, self.stamp = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a friendship graph snapshot')
+
+        view = memoryview(self._mmap)
+        neighbours_at = OFFSETS_AT + 8 * (self.nodes + 1)
+        self.offsets = view[OFFSETS_AT:neighbours_at].cast('Q')
+        self.neighbours = view[neighbours_at:neighbours_at + 4 * size].cast('I')
+
+    def is_stale(self) -> bool:
+        """
+        the snapshot file was replaced since it was opened
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        return (stat.st_ino, stat.st_mtime_ns) != (self.stat.st_ino, self.stat.st_mtime_ns)
+
+    def neighbours_of(self, node: int) -> memoryview:
+        if not 0 <= node < self.nodes:
+            return self.neighbours[0:0]
+        return self.neighbours[self.offsets[node]:self.offsets[node + 1]]
+
+    def degree(self, node: int) -> int:
+        return len(self.neighbours_of(node))
+
+    def are_friends(self, a: int, b: int) -> bool:
+        neighbours = self.neighbours_of(a)
+        i = bisect_left(neighbours, b)
+        return i < len(neighbours) and neighbours[i] == b
+
+    def edges(self) -> Iterator[Tuple[int, int]]:
+        """
+        (source, target) edges, sorted
+        """
+        for source in range(self.nodes):
+            for target in self.neighbours_of(source):
+                yield source, target
+
+    def __len__(self) -> int:
+        """
+        number of friendships (each one is an edge both ways)
+        """
+        return len(self.neighbours) // 2
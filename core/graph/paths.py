@@ -0,0 +1,88 @@
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from friendships.models import Friendship
+from .csr import FriendshipGraph
+
+# friends of a set of profiles, as (profile, friend) id pairs
+Expand = Callable[[Set[int]], Iterable[Tuple[int, int]]]
+
+# ids per IN (...) list
+BATCH_SIZE = 500
+
+
+def expand_from_db(frontier: Set[int]) -> Iterable[Tuple[int, int]]:
+    """
+    one query per BATCH_SIZE frontier profiles, on Friendship(source, target)
+    """
+    frontier_ids = sorted(frontier)
+    for start in range(0, len(frontier_ids), BATCH_SIZE):
+        yield from (
+            Friendship.objects.filter(source_id__in=frontier_ids[start:start + BATCH_SIZE])
+            .order_by().values_list('source_id', 'target_id'))
+
+
+def expand_from_graph(graph: FriendshipGraph) -> Expand:
+    def expand(frontier: Set[int]) -> Iterable[Tuple[int, int]]:
+        for node in frontier:
+            for friend in graph.neighbours_of(node):
+                yield node, friend
+    return expand
+
+
+def _path(meeting: int, forward: Dict[int, Optional[int]], backward: Dict[int, Optional[int]]) -> List[int]:
+    path = []
+    node: Optional[int] = meeting
+    while node is not None:
+        path.append(node)
+        node = forward[node]
+    path.reverse()
+
+    node = backward[meeting]
+    while node is not None:
+        path.append(node)
+        node = backward[node]
+    return path
+
+
+def shortest_path(source: int, target: int, expand: Expand, max_depth: int,
+                  max_nodes: Optional[int] = None) -> Optional[List[int]]:
+    """
+    One shortest friendship path from source to target (both included), None if they are further apart
+    than max_depth friendships, or if finding out would reach more than max_nodes profiles
+    (the search stops there, expand is not consumed any further).
+    Bidirectional BFS: the smaller frontier is expanded a whole level at a time (one expand call per hop),
+    so a hop costs a few set based queries and each side only goes about max_depth / 2 levels deep.
+    """
+    if source == target:
+        return [source]
+
+    # per side (0: from source, 1: from target): node -> the node it was reached from,
+    # node -> distance to that end, the last level reached and its depth
+    parents: List[Dict[int, Optional[int]]] = [{source: None}, {target: None}]
+    distances: List[Dict[int, int]] = [{source: 0}, {target: 0}]
+    frontiers: List[Set[int]] = [{source}, {target}]
+    depths = [0, 0]
+
+    while frontiers[0] and frontiers[1] and depths[0] + depths[1] < max_depth:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        depths[side] += 1
+
+        reached = set()
+        for node, friend in expand(frontiers[side]):
+            if friend not in parents[side]:
+                parents[side][friend] = node
+                distances[side][friend] = depths[side]
+                reached.add(friend)
+                if max_nodes is not None and len(parents[0]) + len(parents[1]) > max_nodes:
+                    return None
+
+        other_distances = distances[1 - side]
+        meetings = reached & other_distances.keys()
+        if meetings:
+            # the other side nearest meeting node gives the shortest path
+            meeting = min(meetings, key=lambda node: (other_distances[node], node))
+            return _path(meeting, *parents)
+
+        frontiers[side] = reached
+
+    return None
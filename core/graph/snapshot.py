@@ -0,0 +1,99 @@
+import datetime
+import heapq
+import os
+import threading
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from friendships.models import Friendship, FriendshipPair
+from .csr import FriendshipGraph, build, write
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# incremental exports re-read pairs this much older than the snapshot stamp,
+# so rows committed after the previous export with an earlier updated_at are not missed
+STAMP_MARGIN = datetime.timedelta(minutes=5)
+
+FULL = 'full'
+INCREMENTAL = 'incremental'
+
+
+def to_stamp(value: Optional[datetime.datetime]) -> int:
+    """
+    microseconds since the epoch (naive datetimes, USE_TZ = False, are taken as they are)
+    """
+    if value is None:
+        return 0
+    epoch = EPOCH if timezone.is_aware(value) else EPOCH.replace(tzinfo=None)
+    return (value - epoch) // datetime.timedelta(microseconds=1)
+
+
+def from_stamp(stamp: int) -> datetime.datetime:
+    value = EPOCH + datetime.timedelta(microseconds=stamp)
+    return value if settings.USE_TZ else value.replace(tzinfo=None)
+
+
+def open_graph(path: str) -> Optional[FriendshipGraph]:
+    try:
+        return FriendshipGraph(path)
+    except FileNotFoundError:
+        return None
+
+
+def export(path: str, incremental: bool = False, chunk_size: int = 10000) -> Tuple[str, FriendshipGraph]:
+    """
+    Writes the friendship graph snapshot to path.
+    An incremental export adds the pairs changed since the previous snapshot stamp to it, and falls back
+    to a full export when friendships were deleted meanwhile (the pair count no longer adds up).
+    Returns the kind of export done (FULL / INCREMENTAL) and the new snapshot.
+    """
+    previous = open_graph(path) if os.path.exists(path) else None
+    generation = previous.generation + 1 if previous is not None else 1
+
+    if incremental and previous is not None:
+        changed = list(
+            FriendshipPair.objects.filter(updated_at__gte=from_stamp(previous.stamp) - STAMP_MARGIN)
+            .order_by().values_list('low_id', 'high_id', 'updated_at'))
+        added = sorted(
+            edge
+            for low, high, _ in changed if not previous.are_friends(low, high)
+            for edge in ((low, high), (high, low)))
+
+        if FriendshipPair.objects.count() == len(previous) + len(added) // 2:
+            stamp = max([previous.stamp] + [to_stamp(updated_at) for _, _, updated_at in changed])
+            offsets, neighbours = build(heapq.merge(previous.edges(), added))
+            write(path, offsets, neighbours, generation, stamp)
+            return INCREMENTAL, FriendshipGraph(path)
+
+    # the stamp is read first: pairs created while the edges are read are picked up again by the
+    # next incremental export, and skipped as already known
+    stamp = to_stamp(FriendshipPair.objects.aggregate(stamp=Max('updated_at'))['stamp'])
+    edges = (
+        Friendship.objects.order_by('source_id', 'target_id')
+        .values_list('source_id', 'target_id').iterator(chunk_size=chunk_size))
+    offsets, neighbours = build(edges)
+    write(path, offsets, neighbours, generation, stamp)
+    return FULL, FriendshipGraph(path)
+
+
+_graph: Optional[FriendshipGraph] = None
+_graph_lock = threading.Lock()
+
+
+def get_graph() -> Optional[FriendshipGraph]:
+    """
+    This process view of the settings.FRIENDSHIP_GRAPH_PATH snapshot (None if not configured or not exported),
+    reopened once an export replaced the file
+    """
+    global _graph
+    path = settings.FRIENDSHIP_GRAPH_PATH
+    if not path:
+        return None
+
+    with _graph_lock:
+        if _graph is None or _graph.path != path or _graph.is_stale():
+            _graph = open_graph(path)
+        return _graph
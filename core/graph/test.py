@@ -0,0 +1,196 @@
+import os
+import random
+import tempfile
+from collections import defaultdict
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from friendships.models import Friendship, FriendshipPair
+from profiles.models import Profile
+from . import paths, snapshot
+from .csr import FriendshipGraph, build, write
+
+
+class TestCsr(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'graph.csr')
+        # 1 - 2, 1 - 4, 2 - 4 and the isolated 3
+        edges = [(1, 2), (1, 4), (2, 1), (2, 4), (4, 1), (4, 2)]
+        offsets, neighbours = build(edges)
+        write(self.path, offsets, neighbours, generation=3, stamp=42)
+        self.graph = FriendshipGraph(self.path)
+
+    def test_header(self):
+        self.assertEqual((self.graph.generation, self.graph.stamp, self.graph.nodes), (3, 42, 5))
+        self.assertEqual(len(self.graph), 3)
+
+    def test_queries(self):
+        self.assertEqual(list(self.graph.neighbours_of(1)), [2, 4])
+        self.assertEqual(list(self.graph.neighbours_of(3)), [])
+        self.assertEqual(list(self.graph.neighbours_of(99)), [])
+        self.assertEqual(self.graph.degree(4), 2)
+        self.assertTrue(self.graph.are_friends(4, 2))
+        self.assertFalse(self.graph.are_friends(1, 3))
+        self.assertFalse(self.graph.are_friends(99, 1))
+
+    def test_edges(self):
+        self.assertEqual(list(self.graph.edges()), [(1, 2), (1, 4), (2, 1), (2, 4), (4, 1), (4, 2)])
+
+    def test_stale(self):
+        self.assertFalse(self.graph.is_stale())
+        write(self.path, *build([]), generation=4, stamp=43)
+        self.assertTrue(self.graph.is_stale())
+        # the replaced file is still readable through the old mapping
+        self.assertTrue(self.graph.are_friends(1, 2))
+
+    def test_not_a_snapshot(self):
+        with open(self.path, 'wb') as fp:
+            fp.write(bytes(64))
+        with self.assertRaises(ValueError):
+            FriendshipGraph(self.path)
+
+
+class TestSnapshot(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'graph.csr')
+        self.profiles = [Profile.objects.create(name=f'{i}', external_uuid=f'{i}') for i in range(4)]
+        self.a, self.b, self.c, self.d = (profile.id for profile in self.profiles)
+        Friendship.objects.create_pairs([(self.a, self.b), (self.a, self.c)])
+
+    def test_full(self):
+        kind, graph = snapshot.export(self.path)
+        self.assertEqual((kind, graph.generation, len(graph)), (snapshot.FULL, 1, 2))
+        self.assertEqual(list(graph.neighbours_of(self.a)), [self.b, self.c])
+        self.assertTrue(graph.are_friends(self.c, self.a))
+        self.assertEqual(
+            graph.stamp, snapshot.to_stamp(FriendshipPair.objects.latest('updated_at').updated_at))
+
+    def test_incremental(self):
+        snapshot.export(self.path)
+        Friendship.objects.create_pairs([(self.d, self.b)])
+
+        kind, graph = snapshot.export(self.path, incremental=True)
+        self.assertEqual((kind, graph.generation, len(graph)), (snapshot.INCREMENTAL, 2, 3))
+        self.assertEqual(list(graph.neighbours_of(self.b)), [self.a, self.d])
+        self.assertEqual(list(graph.edges()), list(snapshot.export(self.path)[1].edges()))
+
+    def test_incremental_after_delete(self):
+        snapshot.export(self.path)
+        Friendship.objects.delete_pairs([(self.a, self.c)])
+        Friendship.objects.create_pairs([(self.c, self.d)])
+
+        kind, graph = snapshot.export(self.path, incremental=True)
+        self.assertEqual((kind, len(graph)), (snapshot.FULL, 2))
+        self.assertFalse(graph.are_friends(self.a, self.c))
+        self.assertTrue(graph.are_friends(self.d, self.c))
+
+    def test_stamp_round_trip(self):
+        updated_at = FriendshipPair.objects.first().updated_at
+        self.assertEqual(snapshot.from_stamp(snapshot.to_stamp(updated_at)), updated_at)
+
+    def test_get_graph(self):
+        with override_settings(FRIENDSHIP_GRAPH_PATH=self.path):
+            self.assertIsNone(snapshot.get_graph())
+            snapshot.export(self.path)
+            graph = snapshot.get_graph()
+            self.assertEqual(graph.generation, 1)
+            self.assertIs(snapshot.get_graph(), graph)
+
+            snapshot.export(self.path)
+            self.assertEqual(snapshot.get_graph().generation, 2)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_friendship_graph', path=self.path, stdout=out)
+        self.assertIn('2 friendships exported (full, generation 1', out.getvalue())
+
+
+class TestShortestPath(TestCase):
+
+    @staticmethod
+    def expand_from(adjacency: dict):
+        def expand(frontier):
+            return [(node, friend) for node in frontier for friend in adjacency[node]]
+        return expand
+
+    @staticmethod
+    def bfs_distance(adjacency: dict, source: int, target: int):
+        distances = {source: 0}
+        frontier = [source]
+        while frontier:
+            reached = []
+            for node in frontier:
+                for friend in adjacency[node]:
+                    if friend not in distances:
+                        distances[friend] = distances[node] + 1
+                        reached.append(friend)
+            frontier = reached
+        return distances.get(target)
+
+    def test_random_graphs(self):
+        rng = random.Random(7)
+        for _ in range(50):
+            adjacency: dict = defaultdict(set)
+            for _ in range(60):
+                a, b = rng.sample(range(40), 2)
+                adjacency[a].add(b)
+                adjacency[b].add(a)
+            source, target = rng.sample(range(40), 2)
+
+            expected = self.bfs_distance(adjacency, source, target)
+            path = paths.shortest_path(source, target, self.expand_from(adjacency), max_depth=40)
+            if expected is None:
+                self.assertIsNone(path)
+                continue
+
+            self.assertEqual(len(path) - 1, expected)
+            self.assertEqual((path[0], path[-1]), (source, target))
+            for a, b in zip(path, path[1:]):
+                self.assertIn(b, adjacency[a])
+
+    def test_max_depth(self):
+        adjacency = {i: {i - 1, i + 1} for i in range(1, 9)}
+        adjacency.update({0: {1}, 9: {8}})
+        expand = self.expand_from(adjacency)
+        self.assertEqual(paths.shortest_path(0, 9, expand, max_depth=9), list(range(10)))
+        self.assertIsNone(paths.shortest_path(0, 9, expand, max_depth=8))
+        self.assertEqual(paths.shortest_path(3, 3, expand, max_depth=1), [3])
+
+    def test_max_nodes(self):
+        # 0 and 9 are both friends with 1..8
+        adjacency = {0: set(range(1, 9)), 9: set(range(1, 9))}
+        adjacency.update({i: {0, 9} for i in range(1, 9)})
+        expanded = []
+
+        def expand(frontier):
+            for edge in self.expand_from(adjacency)(frontier):
+                expanded.append(edge)
+                yield edge
+
+        self.assertEqual(len(paths.shortest_path(0, 9, expand, max_depth=6, max_nodes=18)), 3)
+        expanded.clear()
+        self.assertIsNone(paths.shortest_path(0, 9, expand, max_depth=6, max_nodes=5))
+        # stopped in the middle of the first expansion
+        self.assertEqual(len(expanded), 4)
+
+    def test_expand_from_db(self):
+        profiles = [Profile.objects.create(name=f'{i}', external_uuid=f'{i}') for i in range(5)]
+        ids = [profile.id for profile in profiles]
+        Friendship.objects.create_pairs([(ids[0], ids[i]) for i in range(1, 5)])
+
+        with self.assertNumQueries(1):
+            edges = list(paths.expand_from_db(set(ids[1:])))
+        self.assertEqual(sorted(edges), [(id_, ids[0]) for id_ in ids[1:]])
+
+        # a hop costs one query per frontier batch
+        with self.assertNumQueries(2):
+            path = paths.shortest_path(ids[1], ids[4], paths.expand_from_db, max_depth=6)
+        self.assertEqual(path, [ids[1], ids[0], ids[4]])
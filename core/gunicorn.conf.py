@@ -0,0 +1,38 @@
+import os
+
+# http://docs.gunicorn.org/en/stable/settings.html
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+accesslog = '-'
+
+# gunicorn's default (one process), as the service ran before this file. Before raising it:
+# - every worker opens its own db_pool pools: GUNICORN_WORKERS * POSTGRES_POOL_MAX_SIZE connections
+#   (per database, replicas included) must stay under postgres max_connections (100 by default, minus
+#   the migrations / manage.py / admin ones), e.g. 4 workers * 10 = 40
+# - the profile cache and the replica pins need a shared DJANGO_CACHE_BACKEND (locmem is per process)
+# A common starting point is 2 * cpus + 1 workers (or fewer gthread workers with GUNICORN_THREADS)
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))
+
+# "sync": one request per worker process (default)
+# "gthread": GUNICORN_THREADS requests per worker process, so a single process overlaps many database waits
+# (django 2.1 / drf 3.9 have no asgi handler nor async views,
+# threads are how this stack serves concurrent I/O)
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+
+threads = int(os.getenv('GUNICORN_THREADS', '1'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+
+
+def on_starting(server):
+    """
+    empties the /metrics multiprocess directory (see metrics.registry):
+    files left by a previous run would be summed with this one (and pids get reused)
+    """
+    directory = os.getenv('DJANGO_METRICS_MULTIPROCESS_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(directory, name))
@@ -1,5 +1,29 @@
+from django.conf import settings
+from rest_framework_jwt.utils import jwt_decode_handler
+
+from timing import timers
+from .cache import VerifiedTokenCache
+
+
+verified_token_cache = VerifiedTokenCache(max_size=getattr(settings, 'JWT_DECODE_CACHE_SIZE', 0))
+
+
 def jwt_get_uuid_from_payload_handler(payload: dict) -> str:
     """
     Take the uuid, "Profile" table unique key
     """
     return payload['uuid']
+
+
+def jwt_cached_decode_handler(token: str) -> dict:
+    """
+    rest_framework_jwt decode handler (RS256 signature verification)
+    behind a per-process cache of already verified tokens
+    """
+    with timers.timed(timers.JWT):
+        payload = verified_token_cache.get(token)
+        if payload is None:
+            payload = jwt_decode_handler(token)
+            verified_token_cache.set(token, payload)
+
+        return dict(payload)
@@ -0,0 +1,78 @@
+import time
+
+from django.test import TestCase
+from jwt import DecodeError
+from rest_framework_jwt.settings import api_settings as jwt_settings
+
+from .cache import VerifiedTokenCache
+from .handlers import jwt_cached_decode_handler, verified_token_cache
+
+
+class TestVerifiedTokenCache(TestCase):
+
+    def setUp(self):
+        self.cache = VerifiedTokenCache(max_size=2)
+
+    def test_hit_miss(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.set('a', {'uuid': 'a'})
+        self.assertEqual(self.cache.get('a'), {'uuid': 'a'})
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_lru(self):
+        self.cache.set('a', {'uuid': 'a'})
+        self.cache.set('b', {'uuid': 'b'})
+        self.cache.get('a')
+        self.cache.set('c', {'uuid': 'c'})
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+    def test_expired(self):
+        self.cache.set('a', {'uuid': 'a', 'exp': int(time.time()) - 1})
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_non_numeric_exp(self):
+        for exp in ('9999999999', True, [1]):
+            self.cache.set('a', {'uuid': 'a', 'exp': exp})
+            self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_disabled(self):
+        cache = VerifiedTokenCache(max_size=0)
+        cache.set('a', {'uuid': 'a'})
+        self.assertIsNone(cache.get('a'))
+
+
+class TestCachedDecodeHandler(TestCase):
+
+    def setUp(self):
+        verified_token_cache.clear()
+        self.token = jwt_settings.JWT_ENCODE_HANDLER({'uuid': 'a' * 32})
+
+    def test_decode(self):
+        self.assertEqual(jwt_cached_decode_handler(self.token), {'uuid': 'a' * 32})
+        self.assertEqual(jwt_cached_decode_handler(self.token), {'uuid': 'a' * 32})
+        self.assertEqual((verified_token_cache.hits, verified_token_cache.misses), (1, 1))
+
+    def test_bad_token_not_cached(self):
+        with self.assertRaises(DecodeError):
+            jwt_cached_decode_handler('bad.token')
+        with self.assertRaises(DecodeError):
+            jwt_cached_decode_handler('bad.token')
+        self.assertEqual(len(verified_token_cache), 0)
+
+    def test_tampered_token(self):
+        jwt_cached_decode_handler(self.token)
+        header, payload, signature = self.token.split('.')
+        with self.assertRaises(DecodeError):
+            jwt_cached_decode_handler(f'{header}.{payload}.{signature[:-4]}AAAA')
+
+    def test_non_numeric_exp(self):
+        # a signed token whose "exp" passes verification but is a string: decoded, never cached
+        token = jwt_settings.JWT_ENCODE_HANDLER({'uuid': 'a' * 32, 'exp': '9999999999'})
+        for _ in range(2):
+            self.assertEqual(jwt_cached_decode_handler(token)['uuid'], 'a' * 32)
+        self.assertEqual(len(verified_token_cache), 0)
@@ -0,0 +1,31 @@
+from timing import timers
+from . import registry
+
+
+class MetricsMiddleware:
+    """
+    Counts requests and observes their duration, database time and number of queries
+    (as measured by timing.middleware.ServerTimingMiddleware, which must come right after it in MIDDLEWARE)
+    by view name: the url name, "unmatched" for requests that resolved to no view
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unmatched'
+        metrics = registry.get_registry()
+        metrics.inc(registry.REQUESTS, view=view, method=request.method, status=response.status_code)
+
+        timings = getattr(request, 'timings', None)
+        if timings is not None:
+            labels = {'view': view, 'method': request.method}
+            metrics.observe(registry.REQUEST_DURATION, timings.total, **labels)
+            metrics.observe(registry.REQUEST_DB_DURATION, timings.seconds[timers.DB], **labels)
+            metrics.observe(registry.REQUEST_DB_QUERIES, timings.queries, **labels)
+
+        metrics.maybe_flush()
+        return response
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import BasePermission
+
+
+class HasScrapeToken(BasePermission):
+    """
+    "Authorization: Bearer <settings.METRICS_TOKEN>" (prometheus' bearer_token scrape option),
+    nobody gets in while METRICS_TOKEN is empty
+    """
+
+    def has_permission(self, request, view):
+        token = settings.METRICS_TOKEN
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        return bool(token) and constant_time_compare(authorization, f'Bearer {token}')
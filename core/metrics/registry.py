@@ -0,0 +1,238 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+Metric = namedtuple('Metric', ['name', 'kind', 'help', 'buckets'])
+
+# (metric name, sample suffix ("", "_bucket", "_sum", "_count"), sorted label pairs)
+SampleKey = Tuple[str, str, Tuple[Tuple[str, str], ...]]
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUESTS = Metric('http_requests_total', COUNTER, 'Requests by view, method and status.', ())
+REQUEST_DURATION = Metric(
+    'http_request_duration_seconds', HISTOGRAM, 'Request duration by view and method.', SECONDS)
+REQUEST_DB_DURATION = Metric(
+    'http_request_db_duration_seconds', HISTOGRAM, 'Time spent in SQL queries per request.', SECONDS)
+REQUEST_DB_QUERIES = Metric(
+    'http_request_db_queries', HISTOGRAM, 'SQL queries per request.', (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+CACHE_LOOKUPS = Metric('cache_lookups_total', COUNTER, 'Cache lookups by cache and result (hit / miss).', ())
+POOL_CONNECTIONS = Metric(
+    'db_pool_connections', GAUGE, 'Connections of the db_pool pools by alias and state (idle / in_use).', ())
+POOL_CHECKOUTS = Metric('db_pool_checkouts_total', COUNTER, 'Connections handed out by the pools.', ())
+POOL_TIMEOUTS = Metric(
+    'db_pool_timeouts_total', COUNTER, 'Checkouts that timed out waiting for a connection.', ())
+POOL_WAIT = Metric('db_pool_wait_seconds_total', COUNTER, 'Time spent waiting for a pool connection.', ())
+POOL_OPENED = Metric('db_pool_opened_total', COUNTER, 'Connections opened by the pools.', ())
+POOL_DISCARDED = Metric('db_pool_discarded_total', COUNTER, 'Connections closed by the pools.', ())
+
+METRICS = (
+    REQUESTS, REQUEST_DURATION, REQUEST_DB_DURATION, REQUEST_DB_QUERIES, CACHE_LOOKUPS,
+    POOL_CONNECTIONS, POOL_CHECKOUTS, POOL_TIMEOUTS, POOL_WAIT, POOL_OPENED, POOL_DISCARDED,
+)
+
+
+def _labels(labels: dict) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    """
+    Metric samples of this process.
+    With a multiprocess directory (one per server, shared by its worker processes) the samples are also
+    written to <directory>/<pid>.json (atomically, at most every flush_interval seconds),
+    and collect() sums the files of every process: counters and histograms of exited processes included,
+    gauges of live processes only.
+    """
+
+    def __init__(self, directory: str = '', flush_interval: float = 1.0) -> None:
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.samples: Dict[SampleKey, float] = {}
+        self.flushed_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def inc(self, metric: Metric, value: float = 1, **labels) -> None:
+        key = (metric.name, '', _labels(labels))
+        with self._lock:
+            self.samples[key] = self.samples.get(key, 0) + value
+
+    def set(self, metric: Metric, value: float, **labels) -> None:
+        with self._lock:
+            self.samples[(metric.name, '', _labels(labels))] = value
+
+    def observe(self, metric: Metric, value: float, **labels) -> None:
+        """
+        adds value to a histogram (cumulative buckets, like prometheus)
+        """
+        with self._lock:
+            for le in [*metric.buckets, '+Inf']:
+                if le == '+Inf' or value <= le:
+                    key = (metric.name, '_bucket', _labels({**labels, 'le': le}))
+                    self.samples[key] = self.samples.get(key, 0) + 1
+            for suffix, delta in (('_sum', value), ('_count', 1)):
+                key = (metric.name, suffix, _labels(labels))
+                self.samples[key] = self.samples.get(key, 0) + delta
+
+    def collect_process(self) -> None:
+        """
+        samples read from this process state (verified token cache, db_pool pools) instead of counted
+        """
+        from db_pool import pool
+        from jwt_utils.handlers import verified_token_cache
+
+        self.set(CACHE_LOOKUPS, verified_token_cache.hits, cache='jwt', result='hit')
+        self.set(CACHE_LOOKUPS, verified_token_cache.misses, cache='jwt', result='miss')
+
+        for (alias, _), stats in pool.stats().items():
+            self.set(POOL_CONNECTIONS, stats['idle'], alias=alias, state='idle')
+            self.set(POOL_CONNECTIONS, stats['in_use'], alias=alias, state='in_use')
+            for metric, stat in ((POOL_CHECKOUTS, 'checkouts'), (POOL_TIMEOUTS, 'timeouts'),
+                                 (POOL_WAIT, 'wait_time'), (POOL_OPENED, 'opened'),
+                                 (POOL_DISCARDED, 'discarded')):
+                self.set(metric, stats[stat], alias=alias)
+
+    def flush(self) -> None:
+        """
+        writes the samples to <directory>/<pid>.json (creating the directory),
+        a failure is logged (and retried at the next flush), never raised to the request being served
+        """
+        if not self.directory:
+            return
+
+        self.collect_process()
+        with self._lock:
+            samples = [[name, suffix, labels, value]
+                       for (name, suffix, labels), value in self.samples.items()]
+            self.flushed_at = time.monotonic()
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        except OSError:
+            logger.exception('metrics flush to %s failed', self.directory)
+            return
+        try:
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(samples, fp)
+            os.replace(tmp_path, os.path.join(self.directory, f'{os.getpid()}.json'))
+        except OSError:
+            os.unlink(tmp_path)
+            logger.exception('metrics flush to %s failed', self.directory)
+
+    def maybe_flush(self) -> None:
+        due = self.flushed_at is None or time.monotonic() - self.flushed_at >= self.flush_interval
+        if self.directory and due:
+            self.flush()
+
+    def collect(self) -> Dict[SampleKey, float]:
+        """
+        samples of every process (of this one only without a multiprocess directory)
+        """
+        if not self.directory:
+            self.collect_process()
+            with self._lock:
+                return dict(self.samples)
+
+        self.flush()
+        kinds = {metric.name: metric.kind for metric in METRICS}
+        merged: Dict[SampleKey, float] = {}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            pid = int(os.path.basename(path)[:-len('.json')])
+            try:
+                with open(path) as fp:
+                    samples = json.load(fp)
+            except (FileNotFoundError, ValueError):
+                continue
+            live = _alive(pid)
+            for name, suffix, labels, value in samples:
+                if kinds.get(name) == GAUGE and not live:
+                    continue
+                key = (name, suffix, tuple(tuple(pair) for pair in labels))
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _value(value: float) -> str:
+    return repr(float(value))
+
+
+def _sort_key(key: SampleKey) -> tuple:
+    """
+    a histogram label set: its buckets (by le), then _sum and _count
+    """
+    _, suffix, labels = key
+    le = dict(labels).get('le')
+    return (
+        tuple(pair for pair in labels if pair[0] != 'le'),
+        ('_bucket', '_sum', '_count', '').index(suffix),
+        float('inf') if le == '+Inf' else float(le or 0),
+    )
+
+
+def exposition(samples: Dict[SampleKey, float], metrics: Iterable[Metric] = METRICS) -> str:
+    """
+    prometheus text format (0.0.4)
+    """
+    lines: List[str] = []
+    for metric in metrics:
+        keys = sorted((key for key in samples if key[0] == metric.name), key=_sort_key)
+        if not keys:
+            continue
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for key in keys:
+            name, suffix, labels = key
+            rendered = ','.join(f'{label}="{_escape(value)}"' for label, value in labels)
+            lines.append(f'{name}{suffix}{{{rendered}}} {_value(samples[key])}' if rendered
+                         else f'{name}{suffix} {_value(samples[key])}')
+    return '\n'.join(lines) + '\n'
+
+
+_registry: Optional[Registry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> Registry:
+    """
+    the registry of this process, for settings.METRICS_MULTIPROCESS_DIR
+    """
+    global _registry
+    if _registry is None:
+        from django.conf import settings
+
+        with _registry_lock:
+            if _registry is None:
+                _registry = Registry(settings.METRICS_MULTIPROCESS_DIR, settings.METRICS_FLUSH_INTERVAL)
+                # what an exiting worker counted since its last flush
+                atexit.register(_registry.flush)
+    return _registry
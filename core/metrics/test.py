@@ -0,0 +1,133 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+
+from t_helpers.profiles import set_up as profiles_set_up
+from . import registry
+from .registry import Registry
+
+
+class TestRegistry(TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def test_exposition(self):
+        metrics = Registry()
+        metrics.inc(registry.REQUESTS, view='friends-list', method='GET', status=200)
+        metrics.inc(registry.REQUESTS, view='friends-list', method='GET', status=200)
+        for seconds in (0.003, 0.2, 20):
+            metrics.observe(registry.REQUEST_DURATION, seconds, view='friends-list', method='GET')
+
+        text = registry.exposition(metrics.samples)
+        self.assertIn('# TYPE http_requests_total counter\n'
+                      'http_requests_total{method="GET",status="200",view="friends-list"} 2.0\n', text)
+        labels = 'method="GET",view="friends-list"'
+        self.assertIn('# TYPE http_request_duration_seconds histogram\n'
+                      f'http_request_duration_seconds_bucket{{le="0.005",{labels}}} 1.0\n'
+                      f'http_request_duration_seconds_bucket{{le="0.01",{labels}}} 1.0\n', text)
+        self.assertIn(f'http_request_duration_seconds_bucket{{le="0.25",{labels}}} 2.0\n'
+                      f'http_request_duration_seconds_bucket{{le="0.5",{labels}}} 2.0\n', text)
+        self.assertIn(f'http_request_duration_seconds_bucket{{le="10.0",{labels}}} 2.0\n'
+                      f'http_request_duration_seconds_bucket{{le="+Inf",{labels}}} 3.0\n'
+                      f'http_request_duration_seconds_sum{{{labels}}} 20.203\n'
+                      f'http_request_duration_seconds_count{{{labels}}} 3.0\n', text)
+        self.assertNotIn('db_pool_connections', text)
+
+    def test_escape(self):
+        metrics = Registry()
+        metrics.inc(registry.REQUESTS, view='a"b\\c', method='GET', status=200)
+        self.assertIn('view="a\\"b\\\\c"', registry.exposition(metrics.samples))
+
+    def test_multiprocess(self):
+        metrics = Registry(self.directory, flush_interval=3600)
+        metrics.inc(registry.REQUESTS, view='friends-list', method='GET', status=200)
+        metrics.observe(registry.REQUEST_DB_QUERIES, 3, view='friends-list', method='GET')
+
+        # another worker, still running
+        other = Registry(self.directory)
+        other.inc(registry.REQUESTS, 2, view='friends-list', method='GET', status=200)
+        other.set(registry.POOL_CONNECTIONS, 4, alias='default', state='idle')
+        other.flush()
+        os.replace(os.path.join(self.directory, f'{os.getpid()}.json'),
+                   os.path.join(self.directory, f'{os.getppid()}.json'))
+
+        # a worker that exited: its counters still count, its gauges do not
+        exited = subprocess.Popen([sys.executable, '-c', ''])
+        exited.wait()
+        request_labels = (('method', 'GET'), ('status', '200'), ('view', 'friends-list'))
+        pool_labels = (('alias', 'default'), ('state', 'idle'))
+        with open(os.path.join(self.directory, f'{exited.pid}.json'), 'w') as fp:
+            json.dump([
+                ['http_requests_total', '', request_labels, 5],
+                ['db_pool_connections', '', pool_labels, 7],
+            ], fp)
+
+        samples = metrics.collect()
+        self.assertEqual(samples[('http_requests_total', '', request_labels)], 8)
+        self.assertEqual(samples[('db_pool_connections', '', pool_labels)], 4)
+        bucket_labels = (('le', '3'), ('method', 'GET'), ('view', 'friends-list'))
+        self.assertEqual(samples[('http_request_db_queries', '_bucket', bucket_labels)], 1)
+
+    def test_maybe_flush(self):
+        metrics = Registry(self.directory, flush_interval=3600)
+        metrics.maybe_flush()
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        self.assertTrue(os.path.exists(path))
+
+        os.remove(path)
+        metrics.maybe_flush()
+        self.assertFalse(os.path.exists(path))
+
+    def test_missing_directory(self):
+        directory = os.path.join(self.directory, 'missing')
+        metrics = Registry(directory)
+        metrics.inc(registry.REQUESTS, view='friends-list', method='GET', status=200)
+        metrics.flush()
+        self.assertTrue(os.path.exists(os.path.join(directory, f'{os.getpid()}.json')))
+
+    def test_failed_flush(self):
+        # a file where the directory should be: logged, not raised
+        path = os.path.join(self.directory, 'file')
+        open(path, 'w').close()
+        metrics = Registry(path)
+        with self.assertLogs('metrics.registry', 'ERROR'):
+            metrics.maybe_flush()
+
+
+@override_settings(METRICS_TOKEN='scrape')
+class TestMetricsApi(APITestCase):
+    URL = '/metrics'
+    SCRAPE_AUTH = {'HTTP_AUTHORIZATION': 'Bearer scrape'}
+
+    def setUp(self):
+        self.http_auth = profiles_set_up().http_auth
+
+    def test_api(self):
+        self.client.get('/friends', **self.http_auth)
+        self.client.get('/nowhere')
+
+        response = self.client.get(self.URL, **self.SCRAPE_AUTH)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], registry.CONTENT_TYPE)
+        text = response.content.decode()
+        self.assertIn('http_requests_total{method="GET",status="200",view="friends-list"}', text)
+        self.assertIn('http_requests_total{method="GET",status="404",view="unmatched"}', text)
+        self.assertIn('http_request_db_queries_bucket{le="+Inf",method="GET",view="friends-list"}', text)
+        self.assertIn('cache_lookups_total{cache="jwt",result="hit"}', text)
+        self.assertIn('cache_lookups_total{cache="profile",result="miss"}', text)
+
+    def test_refused(self):
+        self.assertEqual(self.client.get(self.URL).status_code, 403)
+        self.assertEqual(self.client.get(self.URL, HTTP_AUTHORIZATION='Bearer other').status_code, 403)
+        # a user's JWT is no scrape token
+        self.assertEqual(self.client.get(self.URL, **self.http_auth).status_code, 403)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(self.URL, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
@@ -0,0 +1,291 @@
+"""
+Query budgets of every endpoint.
+
+Each endpoint is requested with 10, 100 and 1000 related rows (and, for lists, with two page sizes);
+its number of SQL queries must be the same at every size and match its entry in perf/budgets.json,
+so N+1 queries (and any other change in the number of queries) show up in review as a budget change.
+Wall times are recorded too (not asserted, too noisy), set DJANGO_PERF_REPORT to a file path
+to have them written there as JSON.
+"""
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+from unittest import mock
+
+from django.core.cache import caches
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver
+from rest_framework.test import APITestCase
+from rest_framework_jwt.settings import api_settings as jwt_settings
+
+from t_helpers.profiles import set_up as profiles_set_up
+from profiles.models import Profile
+from friendships.models import Friendship, FriendshipInvitation
+from shared.pagination import SimplePagination
+
+BUDGETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'budgets.json')
+
+SIZES = (10, 100, 1000)
+PAGE_SIZES = (5, 50)
+
+# the batch endpoints take at most this many ids / uuids per request
+MAX_BATCH = 500
+
+
+def routes(patterns=None):
+    """
+    (method, url name) of every route (None is the status view), but the debug- ones (local tooling)
+    """
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if hasattr(pattern, 'url_patterns'):
+            yield from routes(pattern.url_patterns)
+        elif not (pattern.name or '').startswith('debug-'):
+            actions = getattr(pattern.callback, 'actions', {'get': None})
+            yield from ((method.upper(), pattern.name) for method in actions)
+
+
+@contextmanager
+def unbatched():
+    """
+    Bulk INSERTs as single statements on SQLite too (split in batches of 999 parameters otherwise),
+    so the budgets are the PostgreSQL ones whichever backend runs the tests
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with mock.patch.object(connection.ops, 'bulk_batch_size', lambda fields, objs: len(objs)):
+        yield
+
+
+class TestQueryBudgets(APITestCase):
+    CONTENT_TYPE = 'json'
+
+    with open(BUDGETS_PATH) as fp:
+        budgets = json.load(fp)
+    timings: dict = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report = os.getenv('DJANGO_PERF_REPORT')
+        if report:
+            with open(report, 'w') as fp:
+                json.dump(cls.timings, fp, indent=2, sort_keys=True)
+
+    def setUp(self):
+        profile_set_up = profiles_set_up()
+        self.vasco, self.chi, self.joao = profile_set_up.profiles
+        self.http_auth = profile_set_up.http_auth
+
+    def others(self, n: int) -> list:
+        Profile.objects.bulk_create(
+            [Profile(external_uuid=uuid.uuid4().hex, name=f'perf {i}') for i in range(n)])
+        return list(Profile.objects.filter(name__startswith='perf ').order_by('id'))
+
+    def friends(self, n: int, profile: Optional[Profile] = None) -> list:
+        others = self.others(n)
+        Friendship.objects.create_pairs([((profile or self.joao).id, other.id) for other in others])
+        return others
+
+    def invitations(self, n: int, received: bool) -> list:
+        others = self.others(n)
+        FriendshipInvitation.objects.bulk_create([
+            FriendshipInvitation(inviting=other, invited=self.joao) if received
+            else FriendshipInvitation(inviting=self.joao, invited=other)
+            for other in others
+        ])
+        field = 'invited' if received else 'inviting'
+        return list(FriendshipInvitation.objects.filter(**{field: self.joao}).order_by('id'))
+
+    def request(self, method: str, url: str, data: Optional[dict] = None, auth: bool = True):
+        kwargs = self.http_auth if auth else {}
+        return getattr(self.client, method.lower())(url, data, format=self.CONTENT_TYPE, **kwargs)
+
+    def measure(self, name: str, seed, paged: bool = False) -> None:
+        """
+        seed(n) creates n related rows and returns the request (a callable) to measure
+        """
+        method, route = name.split()[:2]
+        self.assertIn((method, None if route == 'status' else route), set(routes()))
+
+        page_sizes = PAGE_SIZES if paged else (SimplePagination.page_size,)
+        queries = {}
+        for n in SIZES:
+            for page_size in page_sizes:
+                with transaction.atomic(), mock.patch.object(SimplePagination, 'page_size', page_size):
+                    request = seed(n)
+                    caches[settings.PROFILES_CACHE_ALIAS].clear()
+
+                    with CaptureQueriesContext(connection) as captured, unbatched():
+                        start = time.perf_counter()
+                        response = request()
+                        elapsed = time.perf_counter() - start
+                    transaction.set_rollback(True)
+
+                self.assertLess(response.status_code, 300, f'{name}: {response.content}')
+                queries[(n, page_size)] = len(captured)
+                self.timings.setdefault(name, {})[f'{n} rows, page {page_size}'] = round(elapsed * 1000, 2)
+
+        counts = set(queries.values())
+        self.assertEqual(len(counts), 1, f'{name}: queries grow with the rows / page size {queries}')
+        self.assertEqual(
+            counts.pop(), self.budgets.get(name),
+            f'{name}: queries differ from the budget, update perf/budgets.json if that is expected')
+
+    def test_every_route_has_a_budget(self):
+        budgeted = {tuple(name.split()[:2]) for name in self.budgets}
+        for method, route in routes():
+            self.assertIn((method, route or 'status'), budgeted)
+
+    def test_status(self):
+        def seed(n):
+            self.others(n)
+            return lambda: self.request('GET', '/')
+
+        self.measure('GET status', seed)
+
+    @override_settings(METRICS_TOKEN='scrape')
+    def test_metrics(self):
+        def seed(n):
+            self.others(n)
+            return lambda: self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape')
+
+        self.measure('GET metrics', seed)
+
+    def test_profiles(self):
+        def token():
+            return jwt_settings.JWT_ENCODE_HANDLER({'uuid': uuid.uuid4().hex})
+
+        def seed(n):
+            self.others(n)
+            return lambda: self.request('GET', '/profiles')
+
+        def seed_search(n):
+            self.others(n)
+            return lambda: self.request('GET', '/profiles?search=perf')
+
+        def seed_cursor(n):
+            self.others(n)
+            return lambda: self.request('GET', '/profiles?cursor=&count=true')
+
+        def seed_create(n):
+            self.others(n)
+            return lambda: self.request('POST', '/profiles', {'token': token()}, auth=False)
+
+        self.measure('GET profiles-list', seed, paged=True)
+        self.measure('GET profiles-list search', seed_search, paged=True)
+        self.measure('GET profiles-list cursor', seed_cursor, paged=True)
+        self.measure('POST profiles-list', seed_create)
+
+    def test_profile(self):
+        url = f'/profiles/{self.joao.external_uuid}'
+
+        def seed(method, path, data=None):
+            def seed_n(n):
+                others = self.friends(n)
+                return lambda: self.request(method, path.format(uuid=others[0].external_uuid), data)
+            return seed_n
+
+        self.measure('GET profiles-me', seed('GET', '/profiles/me'))
+        self.measure('GET profiles-detail', seed('GET', '/profiles/{uuid}'))
+        self.measure('PUT profiles-detail', seed('PUT', url, {'name': 'perf'}))
+        self.measure('PATCH profiles-detail', seed('PATCH', url, {'name': 'perf'}))
+
+    def test_mutual_friends(self):
+        def seed(n):
+            others = self.friends(n)
+            Friendship.objects.create_pairs([(self.vasco.id, other.id) for other in others])
+            return lambda: self.request('GET', f'/profiles/{self.vasco.external_uuid}/mutual_friends')
+
+        self.measure('GET profiles-mutual-friends', seed, paged=True)
+
+    def test_distance(self):
+        def seed(n):
+            others = self.friends(n)
+            Friendship.objects.create_pairs([(self.vasco.id, others[-1].id)])
+            return lambda: self.request('GET', f'/profiles/{self.vasco.external_uuid}/distance?path=true')
+
+        self.measure('GET profiles-distance', seed)
+
+    def test_received_invitations(self):
+        url = '/received_friend_invitations'
+
+        def seed(method, path, data=None):
+            def seed_n(n):
+                invitations = self.invitations(n, received=True)
+                return lambda: self.request(method, path.format(id=invitations[0].id), data)
+            return seed_n
+
+        self.measure('GET received_friend_invitations-list', seed('GET', url), paged=True)
+        self.measure('GET received_friend_invitations-list cursor', seed('GET', f'{url}?cursor='), paged=True)
+        self.measure('GET received_friend_invitations-detail', seed('GET', f'{url}/{{id}}'))
+        self.measure('DELETE received_friend_invitations-detail', seed('DELETE', f'{url}/{{id}}'))
+        self.measure('POST received_friend_invitations-accept', seed('POST', f'{url}/{{id}}/accept'))
+        self.measure('POST received_friend_invitations-batch-accept',
+                     seed('POST', f'{url}/batch_accept', {'all': True}))
+        self.measure('POST received_friend_invitations-batch-decline',
+                     seed('POST', f'{url}/batch_decline', {'all': True}))
+
+    def test_created_invitations(self):
+        url = '/created_friend_invitations'
+
+        def seed(method, path):
+            def seed_n(n):
+                invitations = self.invitations(n, received=False)
+                return lambda: self.request(method, path.format(id=invitations[0].id))
+            return seed_n
+
+        def seed_create(n):
+            self.friends(n)
+            other = Profile.objects.create(external_uuid=uuid.uuid4().hex, name='other')
+            return lambda: self.request('POST', url, {'friend_uuid': other.external_uuid})
+
+        def seed_batch(n):
+            friend_uuids = [other.external_uuid for other in self.others(n)[:MAX_BATCH]]
+            return lambda: self.request('POST', f'{url}/batch', {'friend_uuids': friend_uuids})
+
+        self.measure('GET created_friend_invitations-list', seed('GET', url), paged=True)
+        self.measure('GET created_friend_invitations-list cursor', seed('GET', f'{url}?cursor='), paged=True)
+        self.measure('POST created_friend_invitations-list', seed_create)
+        self.measure('POST created_friend_invitations-batch', seed_batch)
+        self.measure('GET created_friend_invitations-detail', seed('GET', f'{url}/{{id}}'))
+        self.measure('DELETE created_friend_invitations-detail', seed('DELETE', f'{url}/{{id}}'))
+
+    def test_friends(self):
+        url = '/friends'
+
+        def seed(method, path):
+            def seed_n(n):
+                self.friends(n)
+                friendship = Friendship.objects.filter(source=self.joao).order_by('id').first()
+                return lambda: self.request(method, path.format(id=friendship.id))
+            return seed_n
+
+        self.measure('GET friends-list', seed('GET', url), paged=True)
+        self.measure('GET friends-list cursor', seed('GET', f'{url}?cursor='), paged=True)
+        self.measure('GET friends-detail', seed('GET', f'{url}/{{id}}'))
+        self.measure('DELETE friends-detail', seed('DELETE', f'{url}/{{id}}'))
+
+    def test_friend_profiles(self):
+        def seed(n):
+            # a third friends, a third invited, a third strangers
+            others = self.others(n)
+            Friendship.objects.create_pairs([(self.joao.id, other.id) for other in others[::3]])
+            FriendshipInvitation.objects.bulk_create(
+                [FriendshipInvitation(inviting=self.joao, invited=other) for other in others[1::3]])
+            return lambda: self.request('GET', '/friend_profiles')
+
+        def seed_relationships(n):
+            others = self.others(n)[:MAX_BATCH]
+            Friendship.objects.create_pairs([(self.joao.id, other.id) for other in others[::3]])
+            uuids = [other.external_uuid for other in others]
+            return lambda: self.request('POST', '/friend_profiles/relationships', {'uuids': uuids})
+
+        self.measure('GET friend_profiles-list', seed, paged=True)
+        self.measure('POST friend_profiles-relationships', seed_relationships)
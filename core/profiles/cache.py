@@ -0,0 +1,66 @@
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from metrics import registry
+
+
+PROFILE_KEY = 'profiles:profile:{}'
+PROFILE_DATA_KEY = 'profiles:profile_data:{}'
+
+
+def _cache():
+    return caches[settings.PROFILES_CACHE_ALIAS]
+
+
+def _get(key: str, name: str):
+    value = _cache().get(key)
+    registry.get_registry().inc(registry.CACHE_LOOKUPS, cache=name, result='miss' if value is None else 'hit')
+    return value
+
+
+def get_profile(external_uuid: str):
+    """
+    Cached Profile instance (or None)
+    """
+    return _get(PROFILE_KEY.format(external_uuid), 'profile')
+
+
+def set_profile(profile) -> None:
+    _cache().set(PROFILE_KEY.format(profile.external_uuid), profile, settings.PROFILES_CACHE_TIMEOUT)
+
+
+def get_profile_data(external_uuid: str) -> Optional[dict]:
+    """
+    Cached ProfileSerializer data (or None)
+    """
+    return _get(PROFILE_DATA_KEY.format(external_uuid), 'profile_data')
+
+
+def set_profile_data(external_uuid: str, data: dict) -> None:
+    _cache().set(PROFILE_DATA_KEY.format(external_uuid), data, settings.PROFILES_CACHE_TIMEOUT)
+
+
+def invalidate(external_uuid: str) -> None:
+    invalidate_many([external_uuid])
+
+
+def invalidate_many(external_uuids: Iterable[str]) -> None:
+    keys = [
+        key.format(external_uuid)
+        for external_uuid in external_uuids for key in (PROFILE_KEY, PROFILE_DATA_KEY)
+    ]
+    if keys:
+        _cache().delete_many(keys)
+
+
+def invalidate_on_commit(external_uuids: Iterable[str], using: Optional[str] = None) -> None:
+    """
+    invalidates now (for the rest of the transaction) and again once the transaction commits:
+    a concurrent reader may have cached the pre-commit rows in between
+    """
+    external_uuids = list(external_uuids)
+    invalidate_many(external_uuids)
+    transaction.on_commit(lambda: invalidate_many(external_uuids), using=using)
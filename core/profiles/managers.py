@@ -1,9 +1,76 @@
-from django.db import models
+from collections import defaultdict
+from typing import Dict
+
+from django.apps import apps
+from django.db import models, router
+from django.db.models import F, Count, OuterRef, Subquery, IntegerField
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import cache
 
 
 class ProfileManager(models.Manager):
     use_in_migrations = True
 
     def get_by_natural_key(self, username):
+        """
+        Used by rest_framework_jwt to authenticate every request, hence cached
+        (invalidated on Profile save / delete, see profiles.signals)
+        """
+        profile = cache.get_profile(username)
+        if profile is None:
+            profile = self.get(external_uuid=username)
+            cache.set_profile(profile)
+
+        return profile
+
+    def update_counters(self, **deltas_by_counter: Dict[int, int]) -> None:
+        """
+        Adds {profile id: delta} to each given counter.
+        Profiles sharing the same deltas are updated together, so a batch costs a couple of UPDATEs
+        (e.g. the batch owner and everyone on the other side). Cached profiles are invalidated
+        (again on commit, callers run this in their transaction) and updated_at is bumped
+        (the ETags of the lists showing them, see shared.conditional).
+        """
+        deltas_by_profile: dict = defaultdict(dict)
+        for counter, deltas in deltas_by_counter.items():
+            for profile_id, delta in deltas.items():
+                if delta:
+                    deltas_by_profile[profile_id][counter] = delta
+
+        ids_by_deltas: dict = defaultdict(list)
+        for profile_id, deltas in deltas_by_profile.items():
+            ids_by_deltas[tuple(sorted(deltas.items()))].append(profile_id)
+
+        for deltas, ids in ids_by_deltas.items():
+            self.filter(id__in=ids).update(updated_at=timezone.now(), **{
+                # never below 0, even if a counter drifted (see recompute_counters)
+                counter: F(counter) + delta if delta > 0 else Greatest(F(counter) + delta, 0)
+                for counter, delta in deltas
+            })
+
+        if deltas_by_profile:
+            profiles = self.filter(id__in=list(deltas_by_profile)).order_by()
+            cache.invalidate_on_commit(
+                profiles.values_list('external_uuid', flat=True), using=router.db_for_write(self.model))
+
+    def recompute_counters(self, id_from: int, id_to: int) -> int:
+        """
+        Recomputes every counter of the profiles with id_from <= id < id_to with a single UPDATE
+        Returns the number of updated profiles.
+        """
+        friendship = apps.get_model('friendships', 'Friendship')
+        invitation = apps.get_model('friendships', 'FriendshipInvitation')
+
+        def count(queryset, field):
+            grouped = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field)
+            counted = grouped.annotate(count=Count('*')).values('count')
+            return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
 
-        return self.get(external_uuid=username)
+        return self.filter(id__gte=id_from, id__lt=id_to).update(
+            updated_at=timezone.now(),
+            friend_count=count(friendship.objects.all(), 'source'),
+            received_invitation_count=count(invitation.objects.all(), 'invited'),
+            sent_invitation_count=count(invitation.objects.all(), 'inviting'),
+        )
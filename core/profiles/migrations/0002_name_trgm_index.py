@@ -0,0 +1,34 @@
+from django.db import migrations
+
+INDEX_NAME = 'profiles_profile_name_trgm'
+
+
+def create_trgm_index(apps, schema_editor):
+    # PostgreSQL only, other backends (SQLite test runs) keep a plain LIKE scan
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # must match the expression django generates for "name__icontains" on PostgreSQL
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} '
+        f'ON profiles_profile USING gin ((UPPER("name"::text)) gin_trgm_ops)'
+    )
+
+
+def drop_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_index, drop_trgm_index),
+    ]
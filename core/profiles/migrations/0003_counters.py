@@ -0,0 +1,49 @@
+# Generated by Django 2.1.4 on 2026-10-18 18:12
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Profile = apps.get_model('profiles', 'Profile')
+    Friendship = apps.get_model('friendships', 'Friendship')
+    FriendshipInvitation = apps.get_model('friendships', 'FriendshipInvitation')
+
+    def count(model, field):
+        grouped = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        counted = grouped.annotate(count=Count('*')).values('count')
+        return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+    Profile.objects.update(
+        friend_count=count(Friendship, 'source'),
+        received_invitation_count=count(FriendshipInvitation, 'invited'),
+        sent_invitation_count=count(FriendshipInvitation, 'inviting'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0002_name_trgm_index'),
+        ('friendships', '0002_auto_20181207_2215'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='friend_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='received_invitation_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='sent_invitation_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
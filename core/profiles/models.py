@@ -23,6 +23,12 @@ class Profile(Base):
 
     name = models.CharField(max_length=128)
 
+    # denormalized counters, kept up to date by the friendships app (see ProfileManager.update_counters)
+    friend_count = models.PositiveIntegerField(default=0, editable=False)
+    received_invitation_count = models.PositiveIntegerField(default=0, editable=False)
+    sent_invitation_count = models.PositiveIntegerField(default=0, editable=False)
+    COUNTERS = ('friend_count', 'received_invitation_count', 'sent_invitation_count')
+
     # django-rest-framework-jwt expects the user object to have this property
     # for now, from profiles are always active
     is_active = True
@@ -32,5 +38,15 @@ class Profile(Base):
 
     objects = ProfileManager()
 
+    def save(self, *args, **kwargs):
+        # counters are maintained with "SET counter = counter + n",
+        # never write them back from a (possibly stale) instance
+        if self.pk is not None and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTERS
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-id']
@@ -1,19 +1,22 @@
+from django.conf import settings
 from rest_framework import serializers
 from rest_framework_jwt.settings import api_settings
 from jwt import ExpiredSignature, DecodeError
 
+from timing.mixins import TimedSerializerMixin
 from .models import Profile
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     uuid = serializers.UUIDField(read_only=True, source='external_uuid')
 
     class Meta:
         model = Profile
-        fields = ('uuid', 'name')
+        fields = ('uuid', 'name', 'friend_count', 'received_invitation_count', 'sent_invitation_count')
+        read_only_fields = ('friend_count', 'received_invitation_count', 'sent_invitation_count')
 
 
-class CreateProfileSerializer(serializers.ModelSerializer):
+class CreateProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     token = serializers.CharField(write_only=True, required=True)
 
     def validate(self, data):
@@ -44,3 +47,14 @@ class CreateProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = ('token',)
+
+
+class DistanceQuerySerializer(serializers.Serializer):
+    max_depth = serializers.IntegerField(min_value=1, required=False)
+    path = serializers.BooleanField(required=False, default=False)
+
+    def validate_max_depth(self, value):
+        if value > settings.PROFILE_DISTANCE_MAX_DEPTH:
+            raise serializers.ValidationError(
+                f'Ensure this value is less than or equal to {settings.PROFILE_DISTANCE_MAX_DEPTH}.')
+        return value
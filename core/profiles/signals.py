@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import cache
+from .models import Profile
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_cache(sender, instance: Profile, using: str, **kwargs):
+    # signals fire inside the save / delete transaction
+    cache.invalidate_on_commit([instance.external_uuid], using=using)
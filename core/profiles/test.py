@@ -1,11 +1,18 @@
+import os
+import tempfile
 import uuid
 import json
 
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
 from rest_framework.test import APITestCase
 from rest_framework.settings import api_settings
 from rest_framework_jwt.settings import api_settings as jwt_settings
 
+from . import cache
 from .models import Profile
+from friendships.models import Friendship
+from graph import snapshot
 from .serializers import ProfileSerializer
 
 
@@ -223,3 +230,247 @@ class TestProfilesApi(APITestCase):
         response = self.client.get(f'{self.URL}/me', **self.http_auth)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()['name'], USER_JOAO['name'])
+
+
+class TestProfilesCache(APITestCase):
+    URL = '/profiles'
+    CONTENT_TYPE = 'application/json'
+
+    def setUp(self):
+        self.joao_profile = Profile.objects.create(**USER_JOAO)
+        self.vasco_profile = Profile.objects.create(**USER_VASCO)
+
+        jwt_encode_handler = jwt_settings.JWT_ENCODE_HANDLER
+        token = jwt_encode_handler({'uuid': USER_JOAO['external_uuid']})
+        self.http_auth = {
+            'HTTP_AUTHORIZATION': f'JWT {token}',
+        }
+
+    def test_get_by_natural_key(self):
+        self.assertIsNone(cache.get_profile(USER_JOAO['external_uuid']))
+        with self.assertNumQueries(1):
+            Profile.objects.get_by_natural_key(USER_JOAO['external_uuid'])
+        with self.assertNumQueries(0):
+            profile = Profile.objects.get_by_natural_key(USER_JOAO['external_uuid'])
+        self.assertEqual(profile, self.joao_profile)
+
+    def test_me_no_queries(self):
+        self.client.get(f'{self.URL}/me', **self.http_auth)
+        with self.assertNumQueries(0):
+            response = self.client.get(f'{self.URL}/me', **self.http_auth)
+        self.assertEqual(response.json(), ProfileSerializer(self.joao_profile).data)
+
+    def test_retrieve_no_queries(self):
+        url = f'{self.URL}/{self.vasco_profile.external_uuid}'
+        self.client.get(url, **self.http_auth)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, **self.http_auth)
+        self.assertEqual(response.json()['name'], USER_VASCO['name'])
+
+    def test_invalidated_on_save(self):
+        self.client.get(f'{self.URL}/me', **self.http_auth)
+        response = self.client.put(
+            f'{self.URL}/{self.joao_profile.external_uuid}',
+            data=json.dumps({'name': 'Joao Acciaioli'}),
+            content_type=self.CONTENT_TYPE,
+            **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(f'{self.URL}/me', **self.http_auth)
+        self.assertEqual(response.json()['name'], 'Joao Acciaioli')
+        profile = Profile.objects.get_by_natural_key(USER_JOAO['external_uuid'])
+        self.assertEqual(profile.name, 'Joao Acciaioli')
+
+    def test_invalidated_on_delete(self):
+        Profile.objects.get_by_natural_key(USER_VASCO['external_uuid'])
+        self.vasco_profile.delete()
+        self.assertIsNone(cache.get_profile(USER_VASCO['external_uuid']))
+
+
+class TestProfilesCacheOnCommit(TransactionTestCase):
+
+    def setUp(self):
+        self.profile = Profile.objects.create(name='Joao', external_uuid=uuid.uuid4().hex)
+
+    def cache_stale(self):
+        """
+        a concurrent request missing the cache before the commit: it caches the committed (old) row
+        """
+        cache.set_profile(self.profile)
+        cache.set_profile_data(self.profile.external_uuid, dict(ProfileSerializer(self.profile).data))
+
+    def assertInvalidated(self):
+        self.assertIsNone(cache.get_profile(self.profile.external_uuid))
+        self.assertIsNone(cache.get_profile_data(self.profile.external_uuid))
+
+    def test_update_counters(self):
+        with transaction.atomic():
+            Profile.objects.update_counters(friend_count={self.profile.id: 1})
+            self.cache_stale()
+        self.assertInvalidated()
+
+    def test_save(self):
+        with transaction.atomic():
+            Profile.objects.get(id=self.profile.id).save()
+            self.cache_stale()
+        self.assertInvalidated()
+
+    def test_delete(self):
+        with transaction.atomic():
+            Profile.objects.get(id=self.profile.id).delete()
+            self.cache_stale()
+        self.assertInvalidated()
+
+
+class TestMutualFriendsApi(APITestCase):
+    URL = '/profiles'
+
+    @classmethod
+    def mutual_friends_url(cls, profile: Profile):
+        return f'{cls.URL}/{profile.external_uuid}/mutual_friends'
+
+    def setUp(self):
+        self.vasco_profile = Profile.objects.create(**USER_VASCO)
+        self.joao_profile = Profile.objects.create(**USER_JOAO)
+        self.chi_profile = Profile.objects.create(**USER_CHI)
+        self.dummies = [Profile.objects.create(external_uuid=str(i), name=f'dummy_{i}') for i in range(0, 4)]
+
+        # joao: chi, dummy_0, dummy_1, dummy_2 | vasco: chi, dummy_1, dummy_2, dummy_3
+        for friend in [self.chi_profile] + self.dummies[:3]:
+            Friendship.objects.create_pairs([(self.joao_profile.id, friend.id)])
+        for friend in [self.chi_profile] + self.dummies[1:]:
+            Friendship.objects.create_pairs([(self.vasco_profile.id, friend.id)])
+
+        jwt_encode_handler = jwt_settings.JWT_ENCODE_HANDLER
+        token = jwt_encode_handler({'uuid': USER_JOAO['external_uuid']})
+        self.http_auth = {
+            'HTTP_AUTHORIZATION': f'JWT {token}',
+        }
+
+    def test_mutual_friends_401(self):
+        response = self.client.get(self.mutual_friends_url(self.vasco_profile))
+        self.assertEqual(response.status_code, 401)
+
+    def test_mutual_friends_404(self):
+        response = self.client.get(f'{self.URL}/{uuid.uuid4().hex}/mutual_friends', **self.http_auth)
+        self.assertEqual(response.status_code, 404)
+
+    def test_mutual_friends_200(self):
+        response = self.client.get(self.mutual_friends_url(self.vasco_profile), **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 3)
+        for profile in self.dummies + [self.chi_profile]:
+            profile.refresh_from_db()
+        self.assertEqual(
+            response.json()['results'],
+            [ProfileSerializer(profile).data
+             for profile in [self.dummies[2], self.dummies[1], self.chi_profile]]
+        )
+
+    def test_mutual_friends_200_none(self):
+        response = self.client.get(self.mutual_friends_url(self.dummies[0]), **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_mutual_friends_200_search(self):
+        url = f'{self.mutual_friends_url(self.vasco_profile)}?search=dummy'
+        response = self.client.get(url, **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+
+
+class TestDistanceApi(APITestCase):
+    URL = '/profiles'
+
+    @classmethod
+    def distance_url(cls, profile: Profile):
+        return f'{cls.URL}/{profile.external_uuid}/distance'
+
+    def setUp(self):
+        self.vasco_profile = Profile.objects.create(**USER_VASCO)
+        self.joao_profile = Profile.objects.create(**USER_JOAO)
+        self.chi_profile = Profile.objects.create(**USER_CHI)
+        self.dummies = [
+            Profile.objects.create(external_uuid=uuid.uuid4().hex, name=f'dummy_{i}') for i in range(4)]
+
+        # joao - dummy_0 - dummy_1 - dummy_2 - dummy_3, chi - dummy_1, vasco has no friends
+        chain = [self.joao_profile] + self.dummies
+        Friendship.objects.create_pairs(
+            [(a.id, b.id) for a, b in zip(chain, chain[1:])] + [(self.chi_profile.id, self.dummies[1].id)])
+
+        jwt_encode_handler = jwt_settings.JWT_ENCODE_HANDLER
+        token = jwt_encode_handler({'uuid': USER_JOAO['external_uuid']})
+        self.http_auth = {
+            'HTTP_AUTHORIZATION': f'JWT {token}',
+        }
+
+    def get_distance(self, profile: Profile, **params):
+        response = self.client.get(self.distance_url(profile), params, **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_distance_401(self):
+        response = self.client.get(self.distance_url(self.vasco_profile))
+        self.assertEqual(response.status_code, 401)
+
+    def test_distance_404(self):
+        response = self.client.get(f'{self.URL}/{uuid.uuid4().hex}/distance', **self.http_auth)
+        self.assertEqual(response.status_code, 404)
+
+    def test_distance_400(self):
+        for max_depth in (0, 7, 'a'):
+            response = self.client.get(
+                self.distance_url(self.vasco_profile), {'max_depth': max_depth}, **self.http_auth)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('max_depth', response.json())
+
+    def test_distance_200(self):
+        self.assertEqual(self.get_distance(self.joao_profile), {'distance': 0})
+        self.assertEqual(self.get_distance(self.dummies[0]), {'distance': 1})
+        self.assertEqual(self.get_distance(self.chi_profile), {'distance': 3})
+        self.assertEqual(self.get_distance(self.dummies[3]), {'distance': 4})
+        self.assertEqual(self.get_distance(self.vasco_profile), {'distance': None})
+
+    def test_distance_200_max_depth(self):
+        self.assertEqual(self.get_distance(self.dummies[3], max_depth=3), {'distance': None})
+        self.assertEqual(self.get_distance(self.dummies[3], max_depth=4), {'distance': 4})
+
+    def test_distance_200_max_nodes(self):
+        with override_settings(PROFILE_DISTANCE_MAX_NODES=4):
+            self.assertEqual(self.get_distance(self.dummies[3]), {'distance': None})
+        with override_settings(PROFILE_DISTANCE_MAX_NODES=10):
+            self.assertEqual(self.get_distance(self.dummies[3]), {'distance': 4})
+
+    def test_distance_200_path(self):
+        data = self.get_distance(self.chi_profile, path='true')
+        self.assertEqual(data['distance'], 3)
+        self.assertEqual(
+            data['path'],
+            [profile.external_uuid
+             for profile in (self.joao_profile, self.dummies[0], self.dummies[1], self.chi_profile)])
+
+        self.assertEqual(self.get_distance(self.vasco_profile, path='true'), {'distance': None, 'path': None})
+
+    def test_distance_200_snapshot(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'graph.csr')
+        snapshot.export(path)
+
+        with override_settings(FRIENDSHIP_GRAPH_PATH=path):
+            self.get_distance(self.vasco_profile)  # warms the profiles cache (authentication)
+            # the profile lookup, no friendship query
+            with self.assertNumQueries(1):
+                self.assertEqual(self.get_distance(self.dummies[3]), {'distance': 4})
+
+    def test_distance_200_snapshot_deleted_profile(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'graph.csr')
+        snapshot.export(path)
+        # the snapshot still has the deleted profile, and its friendships
+        self.dummies[0].delete()
+
+        with override_settings(FRIENDSHIP_GRAPH_PATH=path):
+            self.assertEqual(
+                self.get_distance(self.chi_profile, path='true'), {'distance': None, 'path': None})
@@ -1,16 +1,23 @@
-
+from django.conf import settings
+from django.shortcuts import get_object_or_404
 from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, ListModelMixin
 from rest_framework.viewsets import GenericViewSet
-from rest_framework.filters import SearchFilter
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from graph import paths, snapshot
+from replicas import routers
+from replicas.mixins import ReplicaReadMixin
+from shared.filters import TrigramSearchFilter
+from shared.pagination import KeysetPagination
+from . import cache
 from .models import Profile
-from .serializers import ProfileSerializer, CreateProfileSerializer
+from .serializers import ProfileSerializer, CreateProfileSerializer, DistanceQuerySerializer
 from .permissions import ProfilePermissions
 
 
-class ProfileViewSet(CreateModelMixin,
+class ProfileViewSet(ReplicaReadMixin,
+                     CreateModelMixin,
                      RetrieveModelMixin,
                      UpdateModelMixin,
                      ListModelMixin,
@@ -19,10 +26,13 @@ class ProfileViewSet(CreateModelMixin,
     model_class = Profile
     serializer_class = ProfileSerializer
     create_serializer_class = CreateProfileSerializer
+    distance_query_serializer_class = DistanceQuerySerializer
     permission_classes = (ProfilePermissions,)
     lookup_field = 'external_uuid'
-    filter_backends = (SearchFilter,)
+    filter_backends = (TrigramSearchFilter,)
     search_fields = ('name',)
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-id',)
 
     def get_queryset(self):
         return self.model_class.objects.all()
@@ -33,8 +43,78 @@ class ProfileViewSet(CreateModelMixin,
 
         return self.serializer_class
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Served from the profile cache when possible (GET is allowed on every profile,
+        so skipping get_object on a cache hit skips no permission check)
+        """
+        data = cache.get_profile_data(kwargs[self.lookup_field])
+        if data is None:
+            # what goes into the (shared) cache is read from the primary, never from a lagging replica
+            routers.use_primary()
+            instance = self.get_object()
+            data = dict(self.get_serializer(instance).data)
+            cache.set_profile_data(instance.external_uuid, data)
+
+        return Response(data)
+
+    @action(methods=['get'], detail=True)
+    def mutual_friends(self, request, *args, **kwargs):
+        """
+        Paginated friends the user shares with the given profile.
+        Each profile filter follows its own join on Friendship.target (friend_target),
+        so it is resolved in the database with index lookups on FriendshipPair(low, high)
+        (the Friendship view branches)
+        """
+        profile = get_object_or_404(self.get_queryset(), **{self.lookup_field: kwargs[self.lookup_field]})
+        queryset = self.get_queryset().filter(friend_target__source=request.user)
+        queryset = queryset.filter(friend_target__source=profile)
+
+        page = self.paginate_queryset(self.filter_queryset(queryset))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['get'], detail=True)
+    def distance(self, request, *args, **kwargs):
+        """
+        Friendship distance from the user to the given profile (null if further than max_depth,
+        or if the search reaches more than PROFILE_DISTANCE_MAX_NODES profiles),
+        ?path=true adds one shortest path (profile uuids, from the user to the profile).
+        Searched on the friendship graph snapshot when there is one (see graph.snapshot),
+        on the database otherwise (a few queries per hop, see graph.paths.shortest_path)
+        """
+        query = self.distance_query_serializer_class(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        max_depth = query.validated_data.get('max_depth', settings.PROFILE_DISTANCE_MAX_DEPTH)
+        profile = get_object_or_404(self.get_queryset(), **{self.lookup_field: kwargs[self.lookup_field]})
+
+        def search(expand):
+            return paths.shortest_path(
+                request.user.id, profile.id, expand, max_depth, settings.PROFILE_DISTANCE_MAX_NODES)
+
+        def get_uuids(path):
+            return dict(self.model_class.objects.filter(id__in=path or []).values_list('id', 'external_uuid'))
+
+        graph = snapshot.get_graph()
+        path = search(paths.expand_from_graph(graph) if graph is not None else paths.expand_from_db)
+        if query.validated_data['path']:
+            uuids = get_uuids(path)
+            if graph is not None and path is not None and len(uuids) < len(path):
+                # a profile of the path was deleted since the snapshot: searched again on the database
+                path = search(paths.expand_from_db)
+                uuids = get_uuids(path)
+
+        data = {'distance': len(path) - 1 if path is not None else None}
+        if query.validated_data['path']:
+            data['path'] = [uuids[id_] for id_ in path] if path is not None else None
+        return Response(data)
+
     @action(methods=['get'], detail=False)
     def me(self, request, *args, **kwargs):
         instance = request.user
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        data = cache.get_profile_data(instance.external_uuid)
+        if data is None:
+            data = dict(self.get_serializer(instance).data)
+            cache.set_profile_data(instance.external_uuid, data)
+
+        return Response(data)
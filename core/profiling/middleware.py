@@ -0,0 +1,46 @@
+import cProfile
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import profiler
+
+
+class ProfilingMiddleware:
+    """
+    Profiles (cProfile, and every SQL query) the requests with a valid X-Profile header
+    (see the profiling_token command) and a PROFILING_SAMPLE_RATE share of the others,
+    into PROFILING_DIR. The profile name is returned in the X-Profile-Id response header
+    (omitted if the profile could not be saved).
+    Not loaded at all without a PROFILING_DIR.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_DIR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiler.should_profile(request):
+            return self.get_response(request)
+
+        queries: list = []
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(profiler.QueryLog(alias, queries)))
+            profile.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.disable()
+        duration = time.perf_counter() - started
+
+        name = profiler.save(profile, request, response, duration, queries)
+        if name is not None:
+            response['X-Profile-Id'] = name
+        return response
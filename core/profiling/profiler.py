@@ -0,0 +1,151 @@
+import datetime
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import time
+import uuid
+from typing import List, Optional
+
+from django.conf import settings
+from django.core import signing
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_X_PROFILE'
+TOKEN_SALT = 'profiling.request'
+
+# <name>.prof (pstats dump: snakeviz, gprof2dot, flameprof...) and <name>.json (request and its SQL)
+# their timestamp (down to the microsecond) orders them, see prune
+NAME_PATTERN = re.compile(r'^\d{8}T\d{12}-[0-9a-f]{8}$')
+
+
+def make_token() -> str:
+    """
+    X-Profile header value, valid for PROFILING_TOKEN_MAX_AGE seconds
+    """
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign('profile')
+
+
+def is_valid_token(token: str) -> bool:
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def should_profile(request) -> bool:
+    token = request.META.get(HEADER)
+    if token is not None:
+        return is_valid_token(token)
+    return random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+class QueryLog:
+    """
+    connection.execute_wrapper keeping every query of the request (alias, sql, params and duration)
+    """
+
+    def __init__(self, alias: str, queries: list) -> None:
+        self.alias = alias
+        self.queries = queries
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': self.alias,
+                'sql': sql,
+                'params': repr(params),
+                'many': many,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+def prune(keep: int) -> None:
+    """
+    removes all but the newest keep profiles of PROFILING_DIR
+    """
+    directory = settings.PROFILING_DIR
+    names = sorted({entry.rpartition('.')[0] for entry in os.listdir(directory)
+                    if NAME_PATTERN.match(entry.rpartition('.')[0])})
+    for name in names[:max(len(names) - keep, 0)]:
+        for extension in ('prof', 'json'):
+            try:
+                os.remove(os.path.join(directory, f'{name}.{extension}'))
+            except FileNotFoundError:
+                pass
+
+
+def save(profile, request, response, duration: float, queries: List[dict]) -> Optional[str]:
+    """
+    writes the profile and its summary in PROFILING_DIR (keeping the newest PROFILING_MAX_PROFILES),
+    returns its name (None if it could not be written: the request is served anyway)
+    """
+    name = f'{datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")}-{uuid.uuid4().hex[:8]}'
+    try:
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        profile.dump_stats(os.path.join(settings.PROFILING_DIR, f'{name}.prof'))
+        with open(os.path.join(settings.PROFILING_DIR, f'{name}.json'), 'w') as fp:
+            json.dump({
+                'name': name,
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 3),
+                'query_count': len(queries),
+                'query_duration_ms': round(sum(query['duration_ms'] for query in queries), 3),
+                'queries': queries,
+            }, fp, indent=2)
+        prune(settings.PROFILING_MAX_PROFILES)
+    except OSError:
+        logger.exception('profile save to %s failed', settings.PROFILING_DIR)
+        return None
+    return name
+
+
+def path_of(name: str, extension: str) -> Optional[str]:
+    if not NAME_PATTERN.match(name):
+        return None
+    path = os.path.join(settings.PROFILING_DIR, f'{name}.{extension}')
+    return path if os.path.exists(path) else None
+
+
+def summaries() -> List[dict]:
+    """
+    saved profiles (without their queries), newest first
+    """
+    results = []
+    directory = settings.PROFILING_DIR
+    names = sorted((entry[:-len('.json')] for entry in os.listdir(directory) if entry.endswith('.json')),
+                   reverse=True) if os.path.isdir(directory) else []
+    for name in names:
+        path = path_of(name, 'json')
+        if path is not None:
+            with open(path) as fp:
+                summary = json.load(fp)
+            summary.pop('queries')
+            results.append(summary)
+    return results
+
+
+def load(name: str, top: int = 40) -> Optional[dict]:
+    """
+    a saved profile with its top functions (by cumulative time) as text
+    """
+    path = path_of(name, 'json')
+    if path is None:
+        return None
+    with open(path) as fp:
+        summary = json.load(fp)
+
+    out = io.StringIO()
+    pstats.Stats(path_of(name, 'prof'), stream=out).sort_stats('cumulative').print_stats(top)
+    summary['stats'] = out.getvalue()
+    return summary
@@ -0,0 +1,108 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.client import RequestFactory
+from rest_framework.test import APITestCase
+
+from t_helpers.profiles import set_up as profiles_set_up
+from . import profiler
+from .middleware import ProfilingMiddleware
+
+
+class TestProfiler(TestCase):
+
+    def test_token(self):
+        out = StringIO()
+        call_command('profiling_token', stdout=out)
+        self.assertTrue(profiler.is_valid_token(out.getvalue().strip()))
+        self.assertFalse(profiler.is_valid_token('profile:1hB2cD:forged'))
+        with override_settings(PROFILING_TOKEN_MAX_AGE=-1):
+            self.assertFalse(profiler.is_valid_token(profiler.make_token()))
+
+    def test_should_profile(self):
+        request = RequestFactory().get('/friends', HTTP_X_PROFILE=profiler.make_token())
+        self.assertTrue(profiler.should_profile(request))
+        # an invalid header is never sampled
+        request = RequestFactory().get('/friends', HTTP_X_PROFILE='profile')
+        with override_settings(PROFILING_SAMPLE_RATE=1):
+            self.assertFalse(profiler.should_profile(request))
+
+        request = RequestFactory().get('/friends')
+        with override_settings(PROFILING_SAMPLE_RATE=0):
+            self.assertFalse(profiler.should_profile(request))
+        with override_settings(PROFILING_SAMPLE_RATE=0.5), mock.patch('random.random', return_value=0.4):
+            self.assertTrue(profiler.should_profile(request))
+
+    @override_settings(PROFILING_DIR='')
+    def test_off(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+
+class TestProfilingApi(APITestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        override = override_settings(PROFILING_DIR=self.directory, PROFILING_SAMPLE_RATE=0,
+                                     PROFILING_LISTING=True)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.http_auth = profiles_set_up().http_auth
+
+    def test_profile(self):
+        response = self.client.get('/friends', **self.http_auth)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+        response = self.client.get('/friends?page=1', HTTP_X_PROFILE=profiler.make_token(), **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+        name = response['X-Profile-Id']
+        self.assertEqual(sorted(os.listdir(self.directory)), [f'{name}.json', f'{name}.prof'])
+
+        profiles = self.client.get('/debug/profiles').json()
+        self.assertEqual([p['name'] for p in profiles], [name])
+        self.assertEqual(profiles[0]['path'], '/friends?page=1')
+        self.assertEqual(profiles[0]['status'], 200)
+        self.assertNotIn('queries', profiles[0])
+
+        profile = self.client.get(f'/debug/profiles/{name}').json()
+        self.assertEqual(profile['query_count'], len(profile['queries']))
+        self.assertTrue(any('friendships_friendship' in query['sql'] for query in profile['queries']))
+        self.assertIn('function calls', profile['stats'])
+
+        response = self.client.get(f'/debug/profiles/{name}/prof')
+        self.assertEqual(response.status_code, 200)
+        with open(os.path.join(self.directory, f'{name}.prof'), 'rb') as fp:
+            self.assertEqual(b''.join(response.streaming_content), fp.read())
+
+    @override_settings(PROFILING_MAX_PROFILES=2)
+    def test_retention(self):
+        names = []
+        for _ in range(3):
+            response = self.client.get('/friends', HTTP_X_PROFILE=profiler.make_token(), **self.http_auth)
+            names.append(response['X-Profile-Id'])
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         [f'{name}.{extension}' for name in names[1:] for extension in ('json', 'prof')])
+
+    def test_save_failure(self):
+        # PROFILING_DIR is a file: the request is served anyway, without a profile
+        path = os.path.join(self.directory, 'file')
+        open(path, 'w').close()
+        with override_settings(PROFILING_DIR=path), self.assertLogs('profiling.profiler', 'ERROR'):
+            response = self.client.get('/friends', HTTP_X_PROFILE=profiler.make_token(), **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_not_found(self):
+        self.assertEqual(self.client.get('/debug/profiles').json(), [])
+        self.assertEqual(self.client.get('/debug/profiles/20260101T000000000000-0123abcd').status_code, 404)
+        self.assertEqual(self.client.get('/debug/profiles/..%2Fsettings/prof').status_code, 404)
+        with override_settings(PROFILING_LISTING=False):
+            self.assertEqual(self.client.get('/debug/profiles').status_code, 404)
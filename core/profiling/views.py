@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.http import FileResponse, Http404
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import profiler
+
+
+class ProfilesView(APIView):
+    """
+    Saved request profiles (see profiling.middleware), only served with PROFILING_LISTING (local settings)
+    """
+    http_method_names = ['get']
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def initial(self, request, *args, **kwargs):
+        if not settings.PROFILING_LISTING:
+            raise Http404
+        super().initial(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        return Response(profiler.summaries())
+
+
+class ProfileView(ProfilesView):
+    """
+    A saved profile: the request, its SQL queries and its top functions
+    """
+
+    def get(self, request, *args, **kwargs):
+        profile = profiler.load(kwargs['name'])
+        if profile is None:
+            raise Http404
+        return Response(profile)
+
+
+class ProfileDumpView(ProfilesView):
+    """
+    The pstats dump of a saved profile (for snakeviz, gprof2dot, flameprof...)
+    """
+
+    def get(self, request, *args, **kwargs):
+        path = profiler.path_of(kwargs['name'], 'prof')
+        if path is None:
+            raise Http404
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{kwargs["name"]}.prof')
+
+
+profiles_view = ProfilesView.as_view()
+profile_view = ProfileView.as_view()
+profile_dump_view = ProfileDumpView.as_view()
@@ -0,0 +1,31 @@
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+from . import routers
+
+
+class ReplicaReadMixin:
+    """
+    Serve read requests from a replica, unless the user wrote something in the last REPLICA_PIN_SECONDS,
+    and pin the user to the primary once a write request is done.
+    replica_read_actions: non safe method actions that only read (e.g. POST lookups)
+    """
+    replica_read_actions: tuple = ()
+
+    writer = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        if request.method not in SAFE_METHODS and self.action not in self.replica_read_actions:
+            self.writer = request.user
+        elif settings.REPLICA_DATABASES and not routers.is_pinned(request.user):
+            routers.use_replica()
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            routers.use_primary()
+            if self.writer is not None:
+                routers.pin(self.writer)
@@ -0,0 +1,83 @@
+import random
+import threading
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+PINNED_KEY = 'replicas:pinned:{}'
+
+# caches a pin set by one worker process is not seen from (or by nobody)
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+_state = threading.local()
+
+
+def use_replica() -> None:
+    """
+    route this thread reads to one of settings.REPLICA_DATABASES, until use_primary
+    """
+    _state.alias = random.choice(tuple(settings.REPLICA_DATABASES)) if settings.REPLICA_DATABASES else None
+
+
+def use_primary() -> None:
+    _state.alias = None
+
+
+def read_alias() -> Optional[str]:
+    return getattr(_state, 'alias', None)
+
+
+def _cache():
+    return caches[settings.REPLICAS_CACHE_ALIAS]
+
+
+def check_pin_cache() -> None:
+    """
+    with replicas, pins must be shared by every worker process (a write served by one of them
+    must send the next reads of its profile to the primary, whichever worker serves them)
+    """
+    backend = settings.CACHES[settings.REPLICAS_CACHE_ALIAS]['BACKEND']
+    if settings.REPLICA_DATABASES and backend in PROCESS_LOCAL_CACHES:
+        raise ImproperlyConfigured(
+            f'REPLICAS_CACHE_ALIAS "{settings.REPLICAS_CACHE_ALIAS}" is a process local cache ({backend}), '
+            f'replicas need a shared one (memcached, ...) to keep read your writes across workers')
+
+
+def pin(profile) -> None:
+    """
+    keep profile reads on the primary for the next REPLICA_PIN_SECONDS (read your own writes)
+    """
+    if settings.REPLICA_DATABASES and profile is not None:
+        _cache().set(PINNED_KEY.format(profile.pk), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(profile) -> bool:
+    return profile is not None and _cache().get(PINNED_KEY.format(profile.pk), False)
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica picked for the current request (see replicas.mixins.ReplicaReadMixin),
+    everything else to "default"
+    """
+
+    def __init__(self):
+        check_pin_cache()
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as "default"
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in settings.REPLICA_DATABASES else None
@@ -0,0 +1,121 @@
+import json
+import tempfile
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+
+from t_helpers.profiles import set_up as profiles_set_up
+from . import routers
+from .routers import ReplicaRouter
+
+
+class TestReplicaRouter(TestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.joao = profiles_set_up().profiles[2]
+        caches['default'].clear()
+
+    def tearDown(self):
+        routers.use_primary()
+
+    def test_no_replicas(self):
+        routers.use_replica()
+        self.assertIsNone(self.router.db_for_read(None))
+
+    @override_settings(REPLICA_DATABASES={'replica_0': {}})
+    def test_routing(self):
+        self.assertIsNone(self.router.db_for_read(None))
+        routers.use_replica()
+        self.assertEqual(self.router.db_for_read(None), 'replica_0')
+        self.assertEqual(self.router.db_for_write(None), 'default')
+        routers.use_primary()
+        self.assertIsNone(self.router.db_for_read(None))
+
+    @override_settings(REPLICA_DATABASES={'replica_0': {}})
+    def test_allow_migrate(self):
+        self.assertFalse(self.router.allow_migrate('replica_0', 'profiles'))
+        self.assertIsNone(self.router.allow_migrate('default', 'profiles'))
+
+    @override_settings(REPLICA_DATABASES={'replica_0': {}})
+    def test_pin(self):
+        self.assertFalse(routers.is_pinned(self.joao))
+        routers.pin(self.joao)
+        self.assertTrue(routers.is_pinned(self.joao))
+        self.assertFalse(routers.is_pinned(None))
+
+    def test_pin_no_replicas(self):
+        routers.pin(self.joao)
+        self.assertFalse(routers.is_pinned(self.joao))
+
+
+class TestPinCache(TestCase):
+    SHARED = 'django.core.cache.backends.filebased.FileBasedCache'
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.location = tmp.name
+        self.joao = profiles_set_up().profiles[2]
+
+    @override_settings(REPLICA_DATABASES={'replica_0': {}})
+    def test_process_local(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ReplicaRouter()
+        with override_settings(CACHES={'default': {'BACKEND': self.SHARED, 'LOCATION': self.location}}):
+            ReplicaRouter()
+
+    def test_no_replicas(self):
+        ReplicaRouter()
+
+    def test_another_worker(self):
+        caches_setting = {'default': {'BACKEND': self.SHARED, 'LOCATION': self.location}}
+        with override_settings(REPLICA_DATABASES={'replica_0': {}}, CACHES=caches_setting):
+            routers.pin(self.joao)
+            # another process: its own instance of the same (shared) cache
+            other_worker = FileBasedCache(self.location, {})
+            with mock.patch.object(routers, '_cache', return_value=other_worker):
+                self.assertTrue(routers.is_pinned(self.joao))
+
+
+# "default" doubles as the replica, so the requests go through
+@override_settings(REPLICA_DATABASES={'default': {}})
+class TestReplicaReadMixin(APITestCase):
+    CONTENT_TYPE = 'application/json'
+
+    def setUp(self):
+        profile_set_up = profiles_set_up()
+        self.vasco, self.chi, self.joao = profile_set_up.profiles
+        self.http_auth = profile_set_up.http_auth
+        caches['default'].clear()
+
+    def get(self, url):
+        with mock.patch.object(routers, 'use_replica', wraps=routers.use_replica) as use_replica:
+            response = self.client.get(url, **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(routers.read_alias())
+        return use_replica.called
+
+    def test_reads_from_replica(self):
+        for url in ('/friends', '/received_friend_invitations', '/created_friend_invitations',
+                    '/friend_profiles', '/profiles'):
+            self.assertTrue(self.get(url), url)
+
+    def test_write_pins_to_primary(self):
+        response = self.client.post(
+            '/created_friend_invitations', data=json.dumps({'friend_uuid': self.chi.uuid}),
+            content_type=self.CONTENT_TYPE, **self.http_auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(routers.is_pinned(self.joao))
+        self.assertFalse(self.get('/created_friend_invitations'))
+
+    def test_read_only_post_does_not_pin(self):
+        response = self.client.post(
+            '/friend_profiles/relationships', data=json.dumps({'uuids': [self.chi.uuid]}),
+            content_type=self.CONTENT_TYPE, **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(routers.is_pinned(self.joao))
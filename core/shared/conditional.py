@@ -0,0 +1,64 @@
+import hashlib
+from functools import reduce
+from typing import Tuple
+
+from django.utils.http import parse_etags
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.status import HTTP_304_NOT_MODIFIED
+
+
+class ConditionalGetMixin:
+    """
+    Conditional GET (If-None-Match) for list and retrieve.
+
+    The (weak) ETag is computed from the rows actually served, before they are serialized:
+    the id and the view's "etag_fields" (updated_at of the row and of the nested rows the serializer shows)
+    of the fetched row, or of every row of the fetched page, with the page envelope (next / previous / count),
+    so it costs no query the response would not make anyway.
+    The request path, the user and the renderer are part of it too.
+    A matching If-None-Match is answered 304 Not Modified, without serializing.
+    """
+    etag_fields: Tuple[str, ...] = ('updated_at',)
+    request: Request  # set by the view
+
+    def get_versions(self, instance) -> tuple:
+        return (instance.pk, *(reduce(getattr, field.split('__'), instance) for field in self.etag_fields))
+
+    def get_etag(self, *versions) -> str:
+        request = self.request
+        key = repr((request.get_full_path(), request.user.pk, request.accepted_renderer.format, versions))
+        return f'W/"{hashlib.md5(key.encode()).hexdigest()}"'
+
+    def is_not_modified(self, etag: str) -> bool:
+        etags = parse_etags(self.request.META.get('HTTP_IF_NONE_MATCH', ''))
+        # weak comparison: W/ prefixes are ignored
+        return '*' in etags or etag[2:] in (e[2:] if e.startswith('W/') else e for e in etags)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset) if page is None else page
+        # the page envelope without its results (no query, whatever the pagination)
+        envelope = None if page is None else self.get_paginated_response([]).data
+        etag = self.get_etag(envelope, [self.get_versions(row) for row in rows])
+
+        if self.is_not_modified(etag):
+            response = Response(status=HTTP_304_NOT_MODIFIED)
+        elif page is None:
+            response = Response(self.get_serializer(rows, many=True).data)
+        else:
+            response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        response['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = self.get_etag(self.get_versions(instance))
+
+        if self.is_not_modified(etag):
+            response = Response(status=HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(self.get_serializer(instance).data)
+        response['ETag'] = etag
+        return response
@@ -0,0 +1,16 @@
+from rest_framework.filters import SearchFilter
+
+
+class TrigramSearchFilter(SearchFilter):
+    """
+    SearchFilter for unprefixed search_fields, i.e. substring ("icontains") lookups.
+
+    On PostgreSQL every term compiles to UPPER("name"::text) LIKE UPPER('%term%'),
+    which is served by the pg_trgm GIN index on that exact expression (profiles migration 0002),
+    instead of a sequential scan of profiles_profile.
+    On other backends (SQLite test runs) it is a plain LIKE scan.
+    """
+
+    def get_search_terms(self, request):
+        # repeated terms only add identical (and equally expensive) LIKE clauses
+        return list(dict.fromkeys(super().get_search_terms(request)))
@@ -0,0 +1,126 @@
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from functools import reduce
+from operator import and_, or_
+from typing import List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+
+class SimplePagination(PageNumberPagination):
+    """
+    Page number pagination.
+    "next" and "previous" are page numbers (or None) instead of urls.
+    """
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.page.next_page_number() if self.page.has_next() else None,
+            'previous': self.page.previous_page_number() if self.page.has_previous() else None,
+            'count': self.page.paginator.count,
+            'results': data,
+        })
+
+
+class KeysetPagination(SimplePagination):
+    """
+    Keyset (seek) pagination, used when the request carries the "cursor" query param
+    (an empty "cursor" requests the first page). Falls back to SimplePagination otherwise.
+
+    Rows are ordered by the view's "keyset_ordering", which must end with a unique field,
+    and each page is fetched with a "WHERE (ordering) after (last row seen)" predicate instead of an OFFSET,
+    so deep pages cost the same as the first one.
+
+    "next" and "previous" are opaque cursors (or None).
+    "count" is only computed when asked for (?count=true).
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering: Tuple[str, ...] = ('-id',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    keyset = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.keyset = True
+        self.page_size = self.get_page_size(request)
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.fields = [queryset.model._meta.get_field(o.lstrip('-')) for o in self.ordering]
+
+        position, reverse = self.decode_cursor(request)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true'):
+            self.count = queryset.count()
+
+        ordering = self._reverse_ordering() if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(position, ordering))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        response = {
+            'next': self.encode_cursor(self.page[-1], False) if self.has_next and self.page else None,
+            'previous': self.encode_cursor(self.page[0], True) if self.has_previous and self.page else None,
+        }
+        if self.count is not None:
+            response['count'] = self.count
+        response['results'] = data
+        return Response(response)
+
+    def _reverse_ordering(self) -> Tuple[str, ...]:
+        return tuple(o[1:] if o.startswith('-') else f'-{o}' for o in self.ordering)
+
+    def _after(self, position: List, ordering: Tuple[str, ...]) -> Q:
+        """
+        Lexicographic "comes after position" predicate for the given ordering:
+        (a > pa) OR (a = pa AND b > pb) OR ... (with < for descending fields)
+        """
+        clauses = []
+        for i, order in enumerate(ordering):
+            attr = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') else 'gt'
+            equal = [Q(**{o.lstrip('-'): position[j]}) for j, o in enumerate(ordering[:i])]
+            clauses.append(reduce(and_, equal + [Q(**{f'{attr}__{lookup}': position[i]})]))
+        return reduce(or_, clauses)
+
+    def encode_cursor(self, instance, reverse: bool) -> str:
+        position = [field.value_to_string(instance) for field in self.fields]
+        return b64encode(json.dumps({'p': position, 'r': reverse}).encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request) -> Tuple[Optional[List], bool]:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if len(cursor['p']) != len(self.fields):
+                raise ValueError
+            position = [field.to_python(value) for field, value in zip(self.fields, cursor['p'])]
+            return position, bool(cursor.get('r', False))
+        except (TypeError, ValueError, KeyError, BinasciiError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
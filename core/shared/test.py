@@ -0,0 +1,199 @@
+from typing import Optional
+from unittest import mock
+
+from rest_framework.test import APITestCase
+from rest_framework.settings import api_settings
+
+from t_helpers.profiles import set_up as profiles_set_up
+from profiles.models import Profile
+from friendships.models import Friendship, FriendshipPair, FriendshipInvitation
+from friendships import counters
+from friendships.views import (
+    CreatedFriendshipInvitationViewSet, FriendshipViewSet, ReceivedFriendshipInvitationViewSet)
+from friend_profiles.views import FriendProfilesViewSet
+from profiles.views import ProfileViewSet
+from shared.filters import TrigramSearchFilter
+from shared.pagination import KeysetPagination
+
+
+class TestKeysetPagination(APITestCase):
+    URL = '/profiles'
+    FRIENDS_URL = '/friends'
+
+    def setUp(self):
+        profile_set_up = profiles_set_up()
+        self.vasco, self.chi, self.joao = profile_set_up.profiles
+        self.http_auth = profile_set_up.http_auth
+
+        self.number_of_dummy_profiles = int(api_settings.PAGE_SIZE * 2.5)
+        self.dummies = [
+            Profile.objects.create(external_uuid=str(i), name=f'dummy_{i}')
+            for i in range(0, self.number_of_dummy_profiles)
+        ]
+
+    def _walk(self, url: str, direction: str, cursor: str = '') -> list:
+        pages = []
+        while cursor is not None:
+            response = self.client.get(url, {'search': 'dummy', 'cursor': cursor}, **self.http_auth)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            cursor = response.json()[direction]
+        return pages
+
+    def test_first_page(self):
+        response = self.client.get(f'{self.URL}?search=dummy&cursor=', **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['previous'])
+        self.assertIsNotNone(response.json()['next'])
+        self.assertNotIn('count', response.json())
+        self.assertEqual(len(response.json()['results']), api_settings.PAGE_SIZE)
+        self.assertEqual(response.json()['results'][0]['uuid'], self.dummies[-1].external_uuid)
+
+    def test_count(self):
+        response = self.client.get(f'{self.URL}?search=dummy&cursor=&count=true', **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], self.number_of_dummy_profiles)
+
+    def test_walk_forward_and_back(self):
+        pages = self._walk(self.URL, 'next')
+        self.assertEqual(len(pages), 3)
+        uuids = [result['uuid'] for page in pages for result in page['results']]
+        self.assertEqual(uuids, [dummy.external_uuid for dummy in reversed(self.dummies)])
+
+        back_pages = self._walk(self.URL, 'previous', pages[-1]['previous'])
+        self.assertEqual(len(back_pages), 2)
+        self.assertEqual(back_pages[0]['results'], pages[1]['results'])
+        self.assertEqual(back_pages[1]['results'], pages[0]['results'])
+        self.assertIsNone(back_pages[1]['previous'])
+
+    def test_walk_composite_ordering(self):
+        # every friendship shares the same updated_at, so "id" has to break the tie
+        Friendship.objects.create_pairs([(self.joao.id, dummy.id) for dummy in self.dummies])
+        updated_at = FriendshipPair.objects.first().updated_at
+        FriendshipPair.objects.update(updated_at=updated_at)
+
+        pages = self._walk(self.FRIENDS_URL, 'next')
+        ids = [result['id'] for page in pages for result in page['results']]
+        friendships = Friendship.objects.filter(source=self.joao)
+        self.assertEqual(ids, sorted(friendships.values_list('id', flat=True)))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'{self.URL}?cursor=bad', **self.http_auth)
+        self.assertEqual(response.status_code, 404)
+
+
+class TestTrigramSearchFilter(APITestCase):
+    URL = '/profiles'
+
+    def setUp(self):
+        profile_set_up = profiles_set_up()
+        self.vasco, self.chi, self.joao = profile_set_up.profiles
+        self.http_auth = profile_set_up.http_auth
+
+    def test_substring(self):
+        response = self.client.get(f'{self.URL}?search=alverd', **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_multiple_terms(self):
+        response = self.client.get(f'{self.URL}?search=vasco valverde vasco', **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(response.json()['results'][0]['uuid'], self.vasco.external_uuid)
+
+    def test_icontains_search_fields(self):
+        # "^", "=", "@" and "$" prefixed fields would produce lookups the trigram index does not cover
+        for view in (ProfileViewSet, FriendProfilesViewSet, FriendshipViewSet,
+                     ReceivedFriendshipInvitationViewSet, CreatedFriendshipInvitationViewSet):
+            self.assertIn(TrigramSearchFilter, view.filter_backends)
+            for field in view.search_fields:
+                self.assertEqual(TrigramSearchFilter().construct_search(field), f'{field}__icontains')
+
+
+class TestConditionalGet(APITestCase):
+    FRIENDS_URL = '/friends'
+    RECEIVED_URL = '/received_friend_invitations'
+
+    def setUp(self):
+        profile_set_up = profiles_set_up()
+        self.vasco, self.chi, self.joao = profile_set_up.profiles
+        self.http_auth = profile_set_up.http_auth
+        Friendship.objects.create_pairs([(self.joao.id, self.vasco.id)])
+
+    def get(self, url: str, etag: Optional[str] = None):
+        headers = {} if etag is None else {'HTTP_IF_NONE_MATCH': etag}
+        return self.client.get(url, **headers, **self.http_auth)
+
+    def assertNotModified(self, url: str) -> str:
+        etag = self.get(url)['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        # weak comparison
+        self.assertEqual(self.get(url, etag[2:]).status_code, 304)
+        self.assertEqual(self.get(url, '*').status_code, 304)
+        return etag
+
+    def assertModified(self, url: str, etag: str) -> None:
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list(self):
+        etag = self.assertNotModified(self.FRIENDS_URL)
+        self.assertEqual(self.get(self.FRIENDS_URL, '"other"').status_code, 200)
+        self.assertModified(f'{self.FRIENDS_URL}?cursor=', etag)
+
+        # a new friend, a friend's name, a friend's counters, a removed friend
+        Friendship.objects.create_pairs([(self.joao.id, self.chi.id)])
+        self.assertModified(self.FRIENDS_URL, etag)
+        etag = self.assertNotModified(self.FRIENDS_URL)
+
+        self.vasco.name = 'Vasco'
+        self.vasco.save()
+        self.assertModified(self.FRIENDS_URL, etag)
+        etag = self.assertNotModified(self.FRIENDS_URL)
+
+        FriendshipInvitation.objects.create(inviting=self.chi, invited=self.vasco)
+        counters.update(counters.invitation_deltas([(self.chi.id, self.vasco.id)], 1))
+        self.assertModified(self.FRIENDS_URL, etag)
+        etag = self.assertNotModified(self.FRIENDS_URL)
+
+        Friendship.objects.delete_pairs([(self.joao.id, self.chi.id)])
+        self.assertModified(self.FRIENDS_URL, etag)
+
+    def test_list_page(self):
+        Friendship.objects.create_pairs([(self.joao.id, self.chi.id)])
+        oldest, newest = Friendship.objects.filter(source=self.joao).order_by('updated_at', 'id')
+        url = f'{self.FRIENDS_URL}?cursor='
+        with mock.patch.object(KeysetPagination, 'page_size', 1):
+            etag = self.assertNotModified(url)
+
+            # the friend on the next page is not part of this one
+            other = oldest.target
+            other.name = 'Renamed'
+            other.save()
+            self.assertEqual(self.get(url, etag).status_code, 304)
+
+            newest.target.name = 'Renamed'
+            newest.target.save()
+            self.assertModified(url, etag)
+
+    def test_list_deleted(self):
+        invitation = FriendshipInvitation.objects.create(inviting=self.chi, invited=self.joao)
+        etag = self.assertNotModified(self.RECEIVED_URL)
+
+        invitation.delete()
+        FriendshipInvitation.objects.create(inviting=self.chi, invited=self.vasco)
+        self.assertModified(self.RECEIVED_URL, etag)
+
+    def test_detail(self):
+        url = f'{self.FRIENDS_URL}/{Friendship.objects.get(source=self.joao).id}'
+        etag = self.assertNotModified(url)
+
+        self.vasco.name = 'Vasco'
+        self.vasco.save()
+        self.assertModified(url, etag)
+        self.assertEqual(self.get(url).json()['friend']['name'], 'Vasco')
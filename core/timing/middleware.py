@@ -0,0 +1,52 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import timers
+
+logger = logging.getLogger('timing.access')
+
+
+class ServerTimingMiddleware:
+    """
+    Times every request: total, database (time and number of queries), JWT decoding, serialization
+    and rendering (see timing.timers), reported as a Server-Timing header (when SERVER_TIMING_HEADER)
+    and as a JSON line on the "timing.access" logger.
+    Phases may overlap: queries made while serializing (lazy relations) count in both db and serialize.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        timings = timers.start()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timers.db_wrapper))
+                response = self.get_response(request)
+        finally:
+            timers.stop()
+        total = timings.total = time.perf_counter() - started
+        request.timings = timings
+
+        if settings.SERVER_TIMING_HEADER:
+            metrics = [f'total;dur={total * 1000:.2f}']
+            metrics.extend(f'{phase};dur={seconds * 1000:.2f}' for phase, seconds in timings.seconds.items())
+            metrics[1] += f';desc="{timings.queries} queries"'
+            response['Server-Timing'] = ', '.join(metrics)
+
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            **{f'{phase}_ms': round(seconds * 1000, 2) for phase, seconds in timings.seconds.items()},
+            'queries': timings.queries,
+        }))
+        return response
@@ -0,0 +1,12 @@
+from . import timers
+
+
+class TimedSerializerMixin:
+    """
+    Serializer mixin adding to_representation to the "serialize" time of the request
+    (list serializers too, they go through their child's to_representation)
+    """
+
+    def to_representation(self, instance):
+        with timers.timed(timers.SERIALIZE):
+            return super().to_representation(instance)
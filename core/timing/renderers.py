@@ -0,0 +1,13 @@
+from rest_framework.renderers import JSONRenderer
+
+from . import timers
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer adding its time to the "render" time of the request
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timers.timed(timers.RENDER):
+            return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,75 @@
+import json
+import time
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from t_helpers.profiles import set_up as profiles_set_up
+from friendships.models import Friendship
+from . import timers
+
+
+class TestTimers(TestCase):
+
+    def tearDown(self):
+        timers.stop()
+
+    def test_no_request(self):
+        with timers.timed(timers.DB):
+            pass
+        self.assertIsNone(timers.current())
+
+    def test_timed(self):
+        timings = timers.start()
+        with timers.timed(timers.SERIALIZE):
+            time.sleep(0.01)
+            # nested (re-entered) phases are not counted twice
+            with timers.timed(timers.SERIALIZE):
+                time.sleep(0.01)
+        self.assertGreaterEqual(timings.seconds[timers.SERIALIZE], 0.02)
+        self.assertLess(timings.seconds[timers.SERIALIZE], 0.04)
+        self.assertEqual(timings.seconds[timers.RENDER], 0)
+
+
+class TestServerTimingMiddleware(APITestCase):
+    URL = '/friends'
+
+    def setUp(self):
+        profile_set_up = profiles_set_up()
+        self.vasco, self.chi, self.joao = profile_set_up.profiles
+        self.http_auth = profile_set_up.http_auth
+        Friendship.objects.create(source=self.joao, target=self.vasco)
+
+    def test_header(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(self.URL, **self.http_auth)
+        self.assertEqual(response.status_code, 200)
+
+        metrics = [metric.split(';') for metric in response['Server-Timing'].split(', ')]
+        self.assertEqual([metric[0] for metric in metrics], ['total', 'db', 'jwt', 'serialize', 'render'])
+        self.assertEqual(metrics[1][2], f'desc="{len(captured)} queries"')
+        durations = [float(metric[1][len('dur='):]) for metric in metrics]
+        self.assertGreater(durations[0], 0)
+        self.assertGreaterEqual(durations[0], max(durations[1:]))
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_no_header(self):
+        response = self.client.get(self.URL, **self.http_auth)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_access_log(self):
+        with self.assertLogs('timing.access', 'INFO') as logs, CaptureQueriesContext(connection) as captured:
+            self.client.get(self.URL, **self.http_auth)
+            self.client.get(self.URL)
+
+        authenticated, anonymous = (json.loads(record.getMessage()) for record in logs.records)
+        self.assertEqual(authenticated['path'], self.URL)
+        self.assertEqual(authenticated['status'], 200)
+        self.assertEqual(authenticated['queries'], len(captured))
+        self.assertGreater(authenticated['total_ms'], authenticated['db_ms'])
+        self.assertEqual(anonymous['status'], 401)
+        self.assertEqual(anonymous['queries'], 0)
+        self.assertEqual(anonymous['jwt_ms'], 0)
+        self.assertIsNone(timers.current())
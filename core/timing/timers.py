@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+# phases reported by timing.middleware.ServerTimingMiddleware, in Server-Timing order
+DB = 'db'
+JWT = 'jwt'
+SERIALIZE = 'serialize'
+RENDER = 'render'
+PHASES = (DB, JWT, SERIALIZE, RENDER)
+
+_state = threading.local()
+
+
+class Timings:
+    """
+    Seconds spent in each phase (and number of queries) by the request handled in this thread
+    """
+
+    def __init__(self) -> None:
+        self.seconds: OrderedDict = OrderedDict((phase, 0.0) for phase in PHASES)
+        self.queries = 0
+        self.total = 0.0
+        self.running: set = set()
+
+
+def start() -> Timings:
+    _state.timings = Timings()
+    return _state.timings
+
+
+def stop() -> None:
+    _state.timings = None
+
+
+def current() -> Optional[Timings]:
+    return getattr(_state, 'timings', None)
+
+
+@contextmanager
+def timed(phase: str):
+    """
+    adds the time spent in the block to the phase of the current request (if any),
+    re-entering a phase (e.g. nested serializers) is only timed once
+    """
+    timings = current()
+    if timings is None or phase in timings.running:
+        yield
+        return
+
+    timings.running.add(phase)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.seconds[phase] += time.perf_counter() - started
+        timings.running.discard(phase)
+
+
+def db_wrapper(execute, sql, params, many, context):
+    """
+    connection.execute_wrapper that times (and counts) every query of the current request
+    """
+    timings = current()
+    if timings is not None:
+        timings.queries += 1
+    with timed(DB):
+        return execute(sql, params, many, context)